@@ -0,0 +1,65 @@
+"""
+Compare `coverage combine` (1 worker) with the parallel tree reduction for
+various numbers of coverage files and of workers.
+
+    $ python -m benchmarks.bench_combine --shards 16 64 256 --workers 1 2 4 8
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import pathlib
+import shutil
+import tempfile
+import time
+
+import coverage as coveragepy
+
+from coverage_comment import coverage
+
+
+def make_shards(path: pathlib.Path, num_shards: int, num_files: int) -> None:
+    """
+    Write `num_shards` data files, each having measured a different part of
+    the same `num_files` files.
+    """
+    (path / ".coveragerc").write_text("[run]\nrelative_files = true\n")
+    for shard in range(num_shards):
+        data = coveragepy.CoverageData(
+            basename=str(path / ".coverage"), suffix=f"shard{shard}"
+        )
+        data.add_lines(
+            {
+                f"package/module_{i}.py": range(1 + shard % 7, 500, 1 + shard % 5)
+                for i in range(num_files)
+            }
+        )
+        data.write()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--shards", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1]
+    )
+    parser.add_argument("--files", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{args.files} files per shard, {os.cpu_count()} CPUs")
+    for num_shards in args.shards:
+        with tempfile.TemporaryDirectory() as tmp:
+            template = pathlib.Path(tmp) / "template"
+            template.mkdir()
+            make_shards(path=template, num_shards=num_shards, num_files=args.files)
+            for workers in args.workers:
+                path = pathlib.Path(tmp) / f"workers-{workers}"
+                shutil.copytree(template, path)
+                start = time.perf_counter()
+                coverage.combine_coverage_files(coverage_path=path, workers=workers)
+                duration = time.perf_counter() - start
+                print(f"{num_shards:>5} shards, {workers:>3} workers: {duration:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
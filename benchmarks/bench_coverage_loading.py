@@ -0,0 +1,69 @@
+"""
+Compare the time and the peak (Python) memory it takes to read coverage data
+with each of the coverage loaders.
+
+    $ python -m benchmarks.bench_coverage_loading --files 2000 --lines 200
+"""
+from __future__ import annotations
+
+import argparse
+import pathlib
+import tempfile
+import time
+import tracemalloc
+
+import coverage as coveragepy
+
+from coverage_comment import coverage
+
+
+def make_coverage_data(path: pathlib.Path, num_files: int, num_lines: int) -> None:
+    """
+    Write `num_files` python files of `num_lines` statements each, and a
+    .coverage file where every other line was executed.
+    """
+    data = coveragepy.CoverageData(basename=str(path / ".coverage"))
+    (path / ".coveragerc").write_text("[run]\nrelative_files = true\n")
+    lines = {}
+    for i in range(num_files):
+        package = path / f"package_{i // 100}"
+        package.mkdir(exist_ok=True)
+        file = package / f"module_{i}.py"
+        file.write_text("".join(f"a_{n} = {n}\n" for n in range(num_lines)))
+        lines[str(file.relative_to(path))] = range(1, num_lines + 1, 2)
+    data.add_lines(lines)
+    data.write()
+
+
+def bench(loader: str, path: pathlib.Path, repeat: int) -> tuple[float, int]:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        coverage.get_coverage_info(merge=False, coverage_path=path, loader=loader)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    coverage.get_coverage_info(merge=False, coverage_path=path, loader=loader)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--lines", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = pathlib.Path(tmp)
+        make_coverage_data(path=path, num_files=args.files, num_lines=args.lines)
+        print(f"{args.files} files x {args.lines} lines, best of {args.repeat}")
+        for loader in sorted(coverage.COVERAGE_LOADERS):
+            duration, peak = bench(loader=loader, path=path, repeat=args.repeat)
+            print(f"{loader:>12}: {duration:.3f}s, peak {peak / 2**20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Compare the engines of `get_diff_coverage_info` on large synthetic PRs, with
+different shapes of hunks: whole new files, many one-line hunks, and a few
+small hunks in big files.
+
+    $ python -m benchmarks.bench_diff_coverage --files 1000 --lines 5000
+"""
+from __future__ import annotations
+
+import argparse
+import functools
+import pathlib
+import timeit
+
+from benchmarks.bench_extract_info import make_report
+from coverage_comment import coverage
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--lines", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    report = make_report(num_files=args.files, num_lines=args.lines)
+    cov = coverage.extract_info(data=report, coverage_path=pathlib.Path("."))
+    # Files are built on first access: don't time that
+    for i in range(args.files):
+        cov.files[f"package/module_{i}.py"]
+    shapes: dict[str, coverage.LineIntervals] = {
+        "whole files": [(1, args.lines + 1)],
+        "one-line hunks": [(n, n + 1) for n in range(1, args.lines + 1, 10)],
+        "a few small hunks": [(n, n + 5) for n in range(1, args.lines + 1, 1000)],
+    }
+
+    print(f"{args.files} files of {args.lines} lines, best of {args.repeat}")
+    for shape, intervals in shapes.items():
+        added_lines = {f"package/module_{i}.py": intervals for i in range(args.files)}
+        for engine in sorted(coverage.DIFF_COVERAGE_ENGINES):
+            duration = min(
+                timeit.repeat(
+                    functools.partial(
+                        coverage.get_diff_coverage_info,
+                        added_lines=added_lines,
+                        coverage=cov,
+                        engine=engine,
+                    ),
+                    number=1,
+                    repeat=args.repeat,
+                )
+            )
+            print(f"{shape:>18}, {engine:>9}: {duration * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
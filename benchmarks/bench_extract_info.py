@@ -0,0 +1,85 @@
+"""
+Time `extract_info` followed by `get_diff_coverage_info` on a synthetic report,
+compared to building every file, with and without computing its percentage
+with a Decimal division (which used to be done for each file of the report).
+
+    $ python -m benchmarks.bench_extract_info --files 40000 --changed 10
+"""
+from __future__ import annotations
+
+import argparse
+import datetime
+import pathlib
+import timeit
+
+from coverage_comment import coverage
+
+
+def make_report(num_files: int, num_lines: int) -> dict:
+    summary = {
+        "covered_lines": num_lines - num_lines // 4,
+        "num_statements": num_lines,
+        "missing_lines": num_lines // 4,
+        "excluded_lines": 0,
+    }
+    file_data = {
+        "executed_lines": [n for n in range(1, num_lines + 1) if n % 4],
+        "missing_lines": list(range(4, num_lines + 1, 4)),
+        "excluded_lines": [],
+        "summary": summary,
+    }
+    return {
+        "meta": {
+            "version": "7.0",
+            "timestamp": datetime.datetime.now().isoformat(),
+            "branch_coverage": False,
+            "show_contexts": False,
+        },
+        "files": {f"package/module_{i}.py": file_data for i in range(num_files)},
+        "totals": {
+            key: value * num_files if isinstance(value, int) else value
+            for key, value in summary.items()
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=40_000)
+    parser.add_argument("--lines", type=int, default=100)
+    parser.add_argument("--changed", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    report = make_report(num_files=args.files, num_lines=args.lines)
+    path = pathlib.Path(".")
+    added_lines = {
+        f"package/module_{i}.py": [(1, args.lines + 1)] for i in range(args.changed)
+    }
+
+    def pr() -> None:
+        cov = coverage.extract_info(data=report, coverage_path=path)
+        coverage.get_diff_coverage_info(added_lines=added_lines, coverage=cov)
+
+    def all_files() -> None:
+        cov = coverage.extract_info(data=report, coverage_path=path)
+        for file in cov.files.values():
+            file.info.covered_lines
+
+    def all_percentages() -> None:
+        cov = coverage.extract_info(data=report, coverage_path=path)
+        for file in cov.files.values():
+            file.info.percent_covered
+
+    print(f"{args.files} files, {args.changed} changed, best of {args.repeat}")
+    for name, function in [
+        ("extract + diff coverage", pr),
+        ("extract + build all files", all_files),
+        ("extract + all Decimal percentages", all_percentages),
+    ]:
+        duration = min(timeit.repeat(function, number=1, repeat=args.repeat))
+        print(f"{name:>34}: {duration * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Compare the peak RSS of a `Coverage` object whose FileCoverage line numbers are
+stored as lists of ints (as they used to be) and as `LineNumbers` arrays, on a
+synthetic project. Each representation is measured in a fresh process.
+
+    $ python -m benchmarks.bench_file_coverage_memory --files 50000 --lines 200
+"""
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import multiprocessing
+import pathlib
+import resource
+
+from coverage_comment import coverage
+
+
+@dataclasses.dataclass
+class ListFileCoverage:
+    path: pathlib.Path
+    executed_lines: list[int]
+    missing_lines: list[int]
+    excluded_lines: list[int]
+    info: coverage.CoverageInfo
+
+
+def peak_rss() -> int:
+    # In KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def build(representation: str, num_files: int, num_lines: int) -> tuple[int, int]:
+    file_class = ListFileCoverage if representation == "list" else coverage.FileCoverage
+    before = peak_rss()
+    files = {}
+    for i in range(num_files):
+        path = pathlib.Path(f"package_{i // 100}/module_{i}.py")
+        # 3 lines out of 4 executed, the rest missing
+        executed = [n for n in range(1, num_lines + 1) if n % 4]
+        missing = list(range(4, num_lines + 1, 4))
+        files[path] = file_class(
+            path=path,
+            executed_lines=executed,
+            missing_lines=missing,
+            excluded_lines=[],
+            info=coverage.CoverageInfo(
+                covered_lines=len(executed),
+                num_statements=num_lines,
+                missing_lines=len(missing),
+                excluded_lines=0,
+                num_branches=None,
+                num_partial_branches=None,
+                covered_branches=None,
+                missing_branches=None,
+            ),
+        )
+    return before, peak_rss()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=50_000)
+    parser.add_argument("--lines", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{args.files} files x {args.lines} lines")
+    context = multiprocessing.get_context("spawn")
+    for representation in ["list", "array"]:
+        with context.Pool(processes=1) as pool:
+            before, after = pool.apply(build, (representation, args.files, args.lines))
+        print(
+            f"{representation:>6}: peak RSS {before / 1024:.1f} MiB before, "
+            f"{after / 1024:.1f} MiB after (+{(after - before) / 1024:.1f} MiB)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Compare looking up the files of a diff in a coverage report keyed by Path
+objects (as it used to be), and by normalized strings (as it is now), with
+100k entries on both sides.
+
+    $ python -m benchmarks.bench_path_index --entries 100000
+"""
+from __future__ import annotations
+
+import argparse
+import pathlib
+import timeit
+
+from coverage_comment import coverage
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    coverage_path = pathlib.Path("src")
+    report_keys = [f"package_{i // 100}/module_{i}.py" for i in range(args.entries)]
+    files_data: dict[str, dict] = {key: {} for key in report_keys}
+    diff_files = [f"src/{key}" for key in report_keys]
+
+    def with_paths() -> int:
+        # What extract_info and parse_diff_output used to do
+        files = {coverage_path / key: files_data[key] for key in report_keys}
+        added = [pathlib.Path(file) for file in diff_files]
+        return sum(1 for path in added if path in files)
+
+    def with_strings() -> int:
+        files = coverage.FileCoverages(
+            files_data=files_data, coverage_path=coverage_path
+        )
+        added = [coverage.normalize_path(file) for file in diff_files]
+        return sum(1 for path in added if path in files)
+
+    assert with_paths() == with_strings() == args.entries
+
+    print(f"{args.entries} files in the report and the diff, best of {args.repeat}")
+    for name, function in [("Path keys", with_paths), ("string keys", with_strings)]:
+        duration = min(timeit.repeat(function, number=1, repeat=args.repeat))
+        print(f"{name:>12}: {duration * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+A local, content-addressed cache: entries are stored under a key that is a digest
+of everything they were computed from, so they never need to be invalidated.
+The cache directory can be persisted between runs (e.g. with actions/cache).
+"""
+from __future__ import annotations
+
+import contextlib
+import gzip
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import tempfile
+from collections.abc import Iterator
+from typing import Any
+
+from coverage_comment import log
+
+# Bump this when the format of what we store changes
+CACHE_VERSION = "4"
+
+
+def file_digest(path: pathlib.Path) -> str:
+    with path.open("rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def get_key(*parts: str) -> str:
+    digest = hashlib.sha256(CACHE_VERSION.encode())
+    for part in parts:
+        # Separate parts so that ("ab", "c") and ("a", "bc") don't collide
+        digest.update(b"\0" + part.encode())
+    return digest.hexdigest()
+
+
+def get_path(
+    cache_dir: pathlib.Path, namespace: str, key: str, suffix: str
+) -> pathlib.Path:
+    return cache_dir / namespace / f"{key}{suffix}"
+
+
+def read_json(cache_dir: pathlib.Path, namespace: str, key: str) -> Any | None:
+    path = get_path(
+        cache_dir=cache_dir, namespace=namespace, key=key, suffix=".json.gz"
+    )
+    try:
+        with gzip.open(path, "rt") as f:
+            value = json.load(f)
+    except FileNotFoundError:
+        log.debug(f"Cache miss: {namespace}/{key}")
+        return None
+    except (OSError, ValueError):
+        log.warning(f"Ignoring corrupted cache entry {path}", exc_info=True)
+        return None
+
+    log.debug(f"Cache hit: {namespace}/{key}")
+    return value
+
+
+def write_json(cache_dir: pathlib.Path, namespace: str, key: str, value: Any) -> None:
+    path = get_path(
+        cache_dir=cache_dir, namespace=namespace, key=key, suffix=".json.gz"
+    )
+    with atomic_path(path) as tmp_path, gzip.open(tmp_path, "wt") as f:
+        # Line numbers may be stored as (list-like) LineNumbers
+        json.dump(value, f, separators=(",", ":"), default=list)
+
+
+def read_file(
+    cache_dir: pathlib.Path, namespace: str, key: str, destination: pathlib.Path
+) -> bool:
+    """
+    Copy the cached file to `destination`. Returns whether it was found.
+    """
+    path = get_path(cache_dir=cache_dir, namespace=namespace, key=key, suffix="")
+    try:
+        shutil.copyfile(path, destination)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def write_file(
+    cache_dir: pathlib.Path, namespace: str, key: str, source: pathlib.Path
+) -> None:
+    path = get_path(cache_dir=cache_dir, namespace=namespace, key=key, suffix="")
+    with atomic_path(path) as tmp_path:
+        shutil.copyfile(source, tmp_path)
+
+
+@contextlib.contextmanager
+def atomic_path(path: pathlib.Path) -> Iterator[pathlib.Path]:
+    """
+    Yield a temporary path to write to, which is moved to `path` only if
+    everything went well, so that readers never see partial entries.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    os.close(fd)
+    tmp_path = pathlib.Path(tmp_name)
+    try:
+        yield tmp_path
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    os.replace(tmp_path, path)
@@ -1,13 +1,86 @@
 from __future__ import annotations
 
+import array
+import bisect
+import contextlib
 import dataclasses
 import datetime
 import decimal
+import io
 import json
+import multiprocessing
+import os
 import pathlib
-from collections.abc import Iterable
+import sqlite3
+import sys
+import tempfile
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from typing import IO, Any, overload
 
-from coverage_comment import log, subprocess
+import coverage as coveragepy
+from coverage import files as coverage_files
+from coverage import report_core
+from coverage.data import combinable_files
+from coverage.python import PythonFileReporter
+from coverage.results import Analysis, Numbers
+
+from coverage_comment import cache, json_stream, log, subprocess
+
+# How the coverage data is turned into a `Coverage` object:
+# - "subprocess": run `coverage json` and parse its output
+# - "in-process": use the coverage.py API directly within the action's process,
+#   falling back to "subprocess" if that fails
+# - "sqlite": read the .coverage database ourselves, falling back to
+#   "subprocess" if the data is not something we know how to read
+# - "streaming": run `coverage json` to a temporary file, and parse it one file
+#   entry at a time, storing line numbers compactly as we go
+SUBPROCESS_LOADER = "subprocess"
+IN_PROCESS_LOADER = "in-process"
+SQLITE_LOADER = "sqlite"
+STREAMING_LOADER = "streaming"
+COVERAGE_LOADERS = {
+    SUBPROCESS_LOADER,
+    IN_PROCESS_LOADER,
+    SQLITE_LOADER,
+    STREAMING_LOADER,
+}
+
+# How get_diff_coverage_info intersects the added lines of a file with its
+# executed and missing lines:
+# - "intervals": 2 binary searches in the sorted line numbers per added interval
+# - "numbits": bitwise and of the numbits (see `decode_numbits`) of the lines,
+#   then a popcount
+INTERVALS_DIFF_ENGINE = "intervals"
+NUMBITS_DIFF_ENGINE = "numbits"
+DIFF_COVERAGE_ENGINES = {INTERVALS_DIFF_ENGINE, NUMBITS_DIFF_ENGINE}
+
+# The fields of each file of a `coverage json` report that we use, and keep.
+# Recent versions of coverage.py also report each function and class of the
+# file ("functions", "classes"), which makes the report several times bigger.
+# A feature needing more data should add its fields here.
+# "missing_branches" is only there with branch coverage.
+FILE_FIELDS = (
+    "executed_lines",
+    "summary",
+    "missing_lines",
+    "excluded_lines",
+    "missing_branches",
+)
+
+# The only .coverage schema version we can read natively. It's been stable since
+# coverage 5.0.
+COVERAGE_SCHEMA_VERSION = 7
+
+# The history of the base branch is fetched FETCH_DEPTH commits deep first, then
+# deepened by twice as many commits each time, until it meets the history of
+# HEAD, at most MAX_FETCHES times.
+FETCH_DEPTH = 50
+MAX_FETCHES = 8
+
+
+class UnsupportedCoverageData(Exception):
+    pass
 
 
 @dataclasses.dataclass
@@ -18,11 +91,10 @@ class CoverageMetadata:
     show_contexts: bool
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class CoverageInfo:
     covered_lines: int
     num_statements: int
-    percent_covered: decimal.Decimal
     missing_lines: int
     excluded_lines: int
     num_branches: int | None
@@ -30,21 +102,231 @@ class CoverageInfo:
     covered_branches: int | None
     missing_branches: int | None
 
+    # The percentages are only computed (as Decimals, which are slow) when they
+    # are displayed, which is the case for very few of them.
+    @property
+    def percent_covered(self) -> decimal.Decimal:
+        return compute_coverage(
+            num_covered=self.covered_lines + (self.covered_branches or 0),
+            num_total=self.num_statements + (self.num_branches or 0),
+        )
 
-@dataclasses.dataclass
+
+class LineNumbers(Sequence[int]):
+    """
+    Sorted line numbers, stored in an array of C unsigned ints (4 bytes per
+    line, instead of a pointer to an int object in a list). It reads like a
+    (read-only) list, so that templates can use it as such, and compares equal
+    to a list with the same items.
+    """
+
+    __slots__ = ("_lines",)
+    _lines: array.array[int]
+
+    def __init__(self, lines: Iterable[int] = ()):
+        if isinstance(lines, LineNumbers):
+            self._lines = lines._lines
+        else:
+            self._lines = array.array("I", sorted(lines))
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    @overload
+    def __getitem__(self, index: int) -> int: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> LineNumbers: ...
+
+    def __getitem__(self, index: int | slice) -> int | LineNumbers:
+        if isinstance(index, slice):
+            result = LineNumbers()
+            result._lines = self._lines[index]
+            return result
+        return self._lines[index]
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._lines)
+
+    def __contains__(self, line: object) -> bool:
+        if not isinstance(line, int):
+            return False
+        index = bisect.bisect_left(self._lines, line)
+        return index < len(self._lines) and self._lines[index] == line
+
+    def between(self, start: int, end: int) -> LineNumbers:
+        """
+        Lines from `start` (included) to `end` (excluded), found with 2 binary
+        searches, whatever the size of the interval.
+        """
+        start_index = bisect.bisect_left(self._lines, start)
+        end_index = bisect.bisect_left(self._lines, end, lo=start_index)
+        return self[start_index:end_index]
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, LineNumbers):
+            return self._lines == other._lines
+        if isinstance(other, list | tuple):
+            return self._lines.tolist() == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"LineNumbers({self._lines.tolist()})"
+
+
+# Sorted, non-overlapping (start, end) intervals of line numbers, end excluded
+# (like a range)
+LineIntervals = list[tuple[int, int]]
+
+
+class Arcs:
+    """
+    Branch arcs (source line, destination line), sorted and indexed by source
+    line. A negative destination is an exit from the code object starting at
+    that line. Like LineNumbers, they're stored in arrays of C ints.
+    """
+
+    __slots__ = ("_destinations", "_sources")
+    _sources: array.array[int]
+    _destinations: array.array[int]
+
+    def __init__(self, arcs: Iterable[Sequence[int]] = ()):
+        sorted_arcs = sorted((source, destination) for source, destination in arcs)
+        self._sources = array.array("i", (source for source, _ in sorted_arcs))
+        self._destinations = array.array("i", (dest for _, dest in sorted_arcs))
+
+    def __len__(self) -> int:
+        return len(self._sources)
+
+    def __iter__(self) -> Iterator[tuple[int, int]]:
+        return zip(self._sources, self._destinations)
+
+    def between(self, start: int, end: int) -> list[tuple[int, int]]:
+        """
+        Arcs whose source line is from `start` (included) to `end` (excluded)
+        """
+        start_index = bisect.bisect_left(self._sources, start)
+        end_index = bisect.bisect_left(self._sources, end, lo=start_index)
+        return list(
+            zip(
+                self._sources[start_index:end_index],
+                self._destinations[start_index:end_index],
+            )
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Arcs):
+            return list(self) == list(other)
+        if isinstance(other, list | tuple):
+            return list(self) == [tuple(arc) for arc in other]
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"Arcs({list(self)})"
+
+
+@dataclasses.dataclass(slots=True)
 class FileCoverage:
     path: pathlib.Path
-    executed_lines: list[int]
-    missing_lines: list[int]
-    excluded_lines: list[int]
+    executed_lines: LineNumbers
+    missing_lines: LineNumbers
+    excluded_lines: LineNumbers
     info: CoverageInfo
+    # Only with branch coverage
+    missing_branches: Arcs = dataclasses.field(default_factory=Arcs)
+
+    def __post_init__(self):
+        # Accept any iterable (e.g. the lists from the JSON report)
+        self.executed_lines = LineNumbers(self.executed_lines)
+        self.missing_lines = LineNumbers(self.missing_lines)
+        self.excluded_lines = LineNumbers(self.excluded_lines)
+        if not isinstance(self.missing_branches, Arcs):
+            self.missing_branches = Arcs(self.missing_branches)
+
+
+class FileCoverages(Mapping[pathlib.Path, FileCoverage]):
+    """
+    The FileCoverage of each file of a coverage report, built from the report
+    data the first time each file is accessed: on a pull request, we only look
+    at the few files it touched.
+
+    Files can be looked up with a path or a string (as produced by
+    `normalize_path`), the latter being much cheaper: the report's "files"
+    dict is the index, and no Path object is built until a file is accessed.
+    """
+
+    def __init__(self, files_data: dict[str, dict], coverage_path: pathlib.Path):
+        self._files_data = files_data
+        self._coverage_path = coverage_path
+        self._prefix = get_path_prefix(coverage_path=coverage_path)
+        self._files: dict[str, FileCoverage] = {}
+
+    def _get_key(self, path: str | os.PathLike[str]) -> str | None:
+        for key in get_report_keys(path=path, prefix=self._prefix):
+            if key in self._files_data:
+                return key
+        return None
+
+    def __getitem__(self, path: str | os.PathLike[str]) -> FileCoverage:
+        key = self._get_key(path)
+        if key is None:
+            raise KeyError(path)
+        try:
+            return self._files[key]
+        except KeyError:
+            file = self._files[key] = extract_file_info(
+                path=self._coverage_path / key, file_data=self._files_data[key]
+            )
+            return file
+
+    def __contains__(self, path: object) -> bool:
+        return isinstance(path, str | os.PathLike) and self._get_key(path) is not None
+
+    def __iter__(self) -> Iterator[pathlib.Path]:
+        return (self._coverage_path / key for key in self._files_data)
+
+    def __len__(self) -> int:
+        return len(self._files_data)
+
+
+def normalize_path(path: str | os.PathLike[str]) -> str:
+    """
+    Paths are handled as normalized strings rather than Path objects, which are
+    comparatively expensive to build and hash. Interning them means that all
+    the structures refering to the same file share the same string.
+    """
+    return sys.intern(os.path.normpath(path))
+
+
+def get_path_prefix(coverage_path: pathlib.Path) -> str:
+    """
+    The prefix to remove from a (normalized) path to get its key in a coverage
+    report generated from `coverage_path`.
+    """
+    prefix = normalize_path(coverage_path)
+    return "" if prefix == os.curdir else prefix + os.sep
+
+
+def get_report_keys(path: str | os.PathLike[str], prefix: str) -> list[str]:
+    """
+    The keys under which `path` (which is `coverage_path / <key>`) may appear in
+    the "files" of a coverage report. `prefix` comes from `get_path_prefix`.
+    """
+    keys = []
+    path = normalize_path(path)
+    if path.startswith(prefix):
+        keys.append(path[len(prefix) :])
+    # Files outside the coverage path are reported with absolute paths
+    if os.path.isabs(path):
+        keys.append(path)
+    return keys
 
 
 @dataclasses.dataclass
 class Coverage:
     meta: CoverageMetadata
     info: CoverageInfo
-    files: dict[pathlib.Path, FileCoverage]
+    files: FileCoverages
 
 
 # The format for Diff Coverage objects may seem a little weird, because it
@@ -56,18 +338,34 @@ class Coverage:
 @dataclasses.dataclass
 class FileDiffCoverage:
     path: pathlib.Path
-    percent_covered: decimal.Decimal
+    covered_lines: int
+    num_lines: int
     violation_lines: list[int]
+    # Branches starting from an added line that were never taken, and neither
+    # start nor end on a missing line (only with branch coverage)
+    missing_branches: list[tuple[int, int]] = dataclasses.field(default_factory=list)
+
+    @property
+    def percent_covered(self) -> decimal.Decimal:
+        return compute_coverage(
+            num_covered=self.covered_lines, num_total=self.num_lines
+        )
 
 
 @dataclasses.dataclass
 class DiffCoverage:
     total_num_lines: int
     total_num_violations: int
-    total_percent_covered: decimal.Decimal
     num_changed_lines: int
     files: dict[pathlib.Path, FileDiffCoverage]
 
+    @property
+    def total_percent_covered(self) -> decimal.Decimal:
+        return compute_coverage(
+            num_covered=self.total_num_lines - self.total_num_violations,
+            num_total=self.total_num_lines,
+        )
+
 
 def compute_coverage(num_covered: int, num_total: int) -> decimal.Decimal:
     if num_total == 0:
@@ -76,15 +374,94 @@ def compute_coverage(num_covered: int, num_total: int) -> decimal.Decimal:
 
 
 def get_coverage_info(
-    merge: bool, coverage_path: pathlib.Path
+    merge: bool,
+    coverage_path: pathlib.Path,
+    loader: str = SUBPROCESS_LOADER,
+    combine_workers: int = 1,
+    cache_dir: pathlib.Path | None = None,
+    paths: Iterable[str] | None = None,
 ) -> tuple[dict, Coverage]:
+    """
+    If `paths` is given, the report only contains the line data of those files
+    (the totals are still computed on all files), which is all we need for a
+    pull request.
+    """
+    only_files = None
+    if paths is not None:
+        prefix = get_path_prefix(coverage_path=coverage_path)
+        only_files = {
+            key for path in paths for key in get_report_keys(path=path, prefix=prefix)
+        }
+
+    cache_key = None
+    if cache_dir:
+        cache_key = get_coverage_cache_key(
+            coverage_path=coverage_path, merge=merge, only_files=only_files
+        )
+
+    if cache_dir and cache_key:
+        json_coverage = read_cached_coverage(
+            cache_dir=cache_dir,
+            cache_key=cache_key,
+            coverage_path=coverage_path,
+            merge=merge,
+        )
+        if json_coverage is not None:
+            log.info("Using cached coverage data")
+            return json_coverage, extract_info(
+                data=json_coverage, coverage_path=coverage_path
+            )
+
+    json_coverage = load_coverage_json(
+        merge=merge,
+        coverage_path=coverage_path,
+        loader=loader,
+        combine_workers=combine_workers,
+        only_files=only_files,
+    )
+
+    if cache_dir and cache_key:
+        write_cached_coverage(
+            cache_dir=cache_dir,
+            cache_key=cache_key,
+            coverage_path=coverage_path,
+            merge=merge,
+            json_coverage=json_coverage,
+        )
+
+    return json_coverage, extract_info(data=json_coverage, coverage_path=coverage_path)
+
+
+def load_coverage_json(
+    merge: bool,
+    coverage_path: pathlib.Path,
+    loader: str,
+    combine_workers: int,
+    only_files: set[str] | None = None,
+) -> dict:
     try:
         if merge:
-            subprocess.run("coverage", "combine", path=coverage_path)
+            combine_coverage_files(coverage_path=coverage_path, workers=combine_workers)
 
-        json_coverage = json.loads(
-            subprocess.run("coverage", "json", "-o", "-", path=coverage_path)
-        )
+        if loader in (IN_PROCESS_LOADER, SQLITE_LOADER):
+            try:
+                if loader == SQLITE_LOADER:
+                    return read_coverage_database(
+                        coverage_path=coverage_path, only_files=only_files
+                    )
+                return generate_coverage_json(
+                    coverage_path=coverage_path, only_files=only_files
+                )
+            except (coveragepy.CoverageException, UnsupportedCoverageData) as exc:
+                log.info(
+                    f"Could not read coverage data in-process ({exc}), "
+                    "falling back to `coverage json`"
+                )
+        if loader == STREAMING_LOADER:
+            return stream_coverage_json(
+                coverage_path=coverage_path, only_files=only_files
+            )
+        return run_coverage_json(coverage_path=coverage_path, only_files=only_files)
     except subprocess.SubProcessError as exc:
         if "No source for code:" in str(exc):
             log.error(
@@ -99,7 +476,528 @@ def get_coverage_info(
             )
         raise
 
-    return json_coverage, extract_info(data=json_coverage, coverage_path=coverage_path)
+
+def get_coverage_cache_key(
+    coverage_path: pathlib.Path, merge: bool, only_files: set[str] | None = None
+) -> str | None:
+    """
+    Compute a key identifying the inputs of the coverage report: the data files
+    (the files to combine if merging), the coverage configuration files and the
+    measured source files, which coverage reads to compute the statements, and
+    the files whose line data the report contains.
+    Returns None if some of those files are missing, in which case we don't
+    cache anything.
+    """
+    with contextlib.chdir(coverage_path):
+        config = coveragepy.Coverage().config
+        if merge:
+            data_files = combinable_files(data_file=config.data_file)
+        else:
+            data_files = [config.data_file]
+        if not data_files:
+            return None
+
+        parts = [
+            coveragepy.__version__,
+            str(merge),
+            json.dumps(None if only_files is None else sorted(only_files)),
+        ]
+        try:
+            source_files: set[str] = set()
+            for data_file in sorted(data_files):
+                parts.append(cache.file_digest(pathlib.Path(data_file)))
+                data = coveragepy.CoverageData(basename=data_file)
+                data.read()
+                source_files.update(data.measured_files())
+            for config_file in config.config_files_read:
+                parts.append(cache.file_digest(pathlib.Path(config_file)))
+            for source_file in sorted(source_files):
+                parts += [source_file, cache.file_digest(pathlib.Path(source_file))]
+        except (OSError, coveragepy.CoverageException):
+            log.debug("Cannot compute the coverage cache key", exc_info=True)
+            return None
+
+    return cache.get_key(*parts)
+
+
+def read_cached_coverage(
+    cache_dir: pathlib.Path, cache_key: str, coverage_path: pathlib.Path, merge: bool
+) -> dict | None:
+    json_coverage = cache.read_json(
+        cache_dir=cache_dir, namespace="coverage", key=cache_key
+    )
+    if json_coverage is None or not merge:
+        return json_coverage
+
+    # When merging, the combined data file is expected to exist after we ran,
+    # e.g. for the user to upload it, so we restore it too.
+    with contextlib.chdir(coverage_path):
+        data_file = pathlib.Path(coveragepy.Coverage().config.data_file).resolve()
+    if not cache.read_file(
+        cache_dir=cache_dir,
+        namespace="combined-data",
+        key=cache_key,
+        destination=data_file,
+    ):
+        return None
+    return json_coverage
+
+
+def write_cached_coverage(
+    cache_dir: pathlib.Path,
+    cache_key: str,
+    coverage_path: pathlib.Path,
+    merge: bool,
+    json_coverage: dict,
+) -> None:
+    if merge:
+        with contextlib.chdir(coverage_path):
+            data_file = pathlib.Path(coveragepy.Coverage().config.data_file).resolve()
+        cache.write_file(
+            cache_dir=cache_dir,
+            namespace="combined-data",
+            key=cache_key,
+            source=data_file,
+        )
+    cache.write_json(
+        cache_dir=cache_dir, namespace="coverage", key=cache_key, value=json_coverage
+    )
+
+
+def combine_coverage_files(coverage_path: pathlib.Path, workers: int) -> None:
+    """
+    Equivalent of `coverage combine`. With more than one worker, the data files
+    are merged 2 by 2 in a pool of processes, then the pairs 2 by 2, etc. (a
+    tree reduction), the final result being combined into the usual data file.
+    """
+    if workers <= 1:
+        subprocess.run("coverage", "combine", path=coverage_path)
+        return
+
+    coverage_path = coverage_path.resolve()
+    with contextlib.chdir(coverage_path):
+        data_file = coveragepy.Coverage().config.data_file
+        data_files = combinable_files(data_file=data_file)
+
+    log.info(f"Combining {len(data_files)} coverage files with {workers} workers")
+    with (
+        tempfile.TemporaryDirectory() as tmp_dir,
+        ProcessPoolExecutor(
+            max_workers=workers,
+            # Other threads may be running (e.g. API calls): forking would be
+            # unsafe
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=os.chdir,
+            initargs=(coverage_path,),
+        ) as executor,
+    ):
+        level = 0
+        while len(data_files) > 2:
+            pairs = [data_files[i : i + 2] for i in range(0, len(data_files), 2)]
+            destinations = [
+                os.path.join(tmp_dir, f"combined-{level}-{i}")
+                for i in range(len(pairs))
+            ]
+            data_files = list(executor.map(combine_data_files, pairs, destinations))
+            level += 1
+
+        with contextlib.chdir(coverage_path):
+            cov = coveragepy.Coverage()
+            cov.combine(data_paths=data_files, strict=True)
+            cov.save()
+
+
+def combine_data_files(data_files: list[str], destination: str) -> str:
+    """
+    Combine the given data files into a new data file at `destination`. Runs in a
+    worker process, from the coverage directory.
+    """
+    if len(data_files) == 1:
+        # Odd one out, will be combined at the next level
+        return data_files[0]
+    cov = coveragepy.Coverage(data_file=destination)
+    cov.combine(data_paths=data_files, strict=True)
+    cov.save()
+    return destination
+
+
+def run_coverage_json(
+    coverage_path: pathlib.Path, only_files: set[str] | None = None
+) -> dict:
+    data = json.loads(subprocess.run("coverage", "json", "-o", "-", path=coverage_path))
+    # `coverage json --include` would also restrict the totals
+    data["files"] = {
+        filename: {
+            field: file_data[field] for field in FILE_FIELDS if field in file_data
+        }
+        for filename, file_data in data["files"].items()
+        if only_files is None or filename in only_files
+    }
+    return data
+
+
+def stream_coverage_json(
+    coverage_path: pathlib.Path, only_files: set[str] | None = None
+) -> dict:
+    """
+    Same as `run_coverage_json`, but without holding the whole report in memory,
+    neither as text nor as Python objects: the report is written to a file,
+    which we parse incrementally, storing line numbers as LineNumbers.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        report_path = pathlib.Path(tmp_dir) / "coverage.json"
+        subprocess.run("coverage", "json", "-o", str(report_path), path=coverage_path)
+        with report_path.open() as f:
+            return read_coverage_json(file=f, only_files=only_files)
+
+
+def read_coverage_json(file: IO[str], only_files: set[str] | None = None) -> dict:
+    data: dict[str, Any] = {}
+    reader = json_stream.JSONStreamReader(file=file)
+    for key in reader.iter_object_keys():
+        if key != "files":
+            data[key] = reader.read_value()
+            continue
+
+        files = data["files"] = {}
+        for filename in reader.iter_object_keys():
+            # Fields are decoded even if we skip them, but only one at a time.
+            keep = only_files is None or filename in only_files
+            file_data = {}
+            for field in reader.iter_object_keys():
+                value = reader.read_value()
+                if keep and field in FILE_FIELDS:
+                    file_data[field] = value
+            if not keep:
+                continue
+            for lines_key in ["executed_lines", "missing_lines", "excluded_lines"]:
+                file_data[lines_key] = LineNumbers(file_data[lines_key])
+            files[filename] = file_data
+    return data
+
+
+def generate_coverage_json(
+    coverage_path: pathlib.Path, only_files: set[str] | None = None
+) -> dict:
+    """
+    Build the same data as `coverage json` (minus the parts we don't read),
+    but using the coverage.py API from within our own process. This saves
+    starting an interpreter, serializing the whole report to JSON, piping it
+    and parsing it back.
+    """
+    with loaded_coverage(coverage_path=coverage_path) as cov:
+        return get_coverage_json(cov=cov, only_files=only_files)
+
+
+def get_coverage_reports(
+    merge: bool,
+    coverage_path: pathlib.Path,
+    loader: str,
+    html_destination: pathlib.Path | None,
+    combine_workers: int = 1,
+) -> tuple[dict, Coverage, str]:
+    """
+    Compute everything we need on the default branch: the coverage data (raw and
+    parsed), the markdown report and, if `html_destination` is provided, the HTML
+    report.
+
+    With the subprocess and streaming loaders, each of them is a separate
+    `coverage` command, each reading the data file and analyzing every source
+    file. With the other loaders, this is done once and shared by all 3 reports.
+    The coverage cache isn't used: the reports need that analysis anyway.
+    """
+    if loader in (IN_PROCESS_LOADER, SQLITE_LOADER):
+        if merge:
+            combine_coverage_files(coverage_path=coverage_path, workers=combine_workers)
+            merge = False
+        try:
+            json_coverage, markdown_report = generate_coverage_reports(
+                coverage_path=coverage_path, html_destination=html_destination
+            )
+        except coveragepy.CoverageException as exc:
+            log.info(
+                f"Could not generate coverage reports in-process ({exc}), "
+                "falling back to `coverage` commands"
+            )
+        else:
+            return (
+                json_coverage,
+                extract_info(data=json_coverage, coverage_path=coverage_path),
+                markdown_report,
+            )
+
+    json_coverage, coverage = get_coverage_info(
+        merge=merge,
+        coverage_path=coverage_path,
+        loader=STREAMING_LOADER if loader == STREAMING_LOADER else SUBPROCESS_LOADER,
+        combine_workers=combine_workers,
+    )
+    if html_destination:
+        generate_coverage_html_files(
+            destination=html_destination, coverage_path=coverage_path
+        )
+    markdown_report = generate_coverage_markdown(coverage_path=coverage_path)
+    return json_coverage, coverage, markdown_report
+
+
+def generate_coverage_reports(
+    coverage_path: pathlib.Path, html_destination: pathlib.Path | None
+) -> tuple[dict, str]:
+    """
+    In-process equivalent of `coverage json`, `coverage report` and
+    `coverage html`, sharing a single analysis of each source file.
+    """
+    # We're going to change directory, let's make it absolute first.
+    html_directory = str(html_destination.resolve()) if html_destination else None
+    with loaded_coverage(coverage_path=coverage_path) as cov:
+        json_coverage = get_coverage_json(cov=cov)
+
+        markdown_report = io.StringIO()
+        cov.report(file=markdown_report, output_format="markdown", show_missing=True)
+
+        if html_directory:
+            cov.html_report(directory=html_directory, skip_empty=True)
+
+    return json_coverage, markdown_report.getvalue()
+
+
+@contextlib.contextmanager
+def loaded_coverage(coverage_path: pathlib.Path) -> Iterator[coveragepy.Coverage]:
+    """
+    Yield a coverage.py object with the data loaded, from within `coverage_path`
+    (coverage reads its configuration and resolves relative paths from the
+    current directory).
+
+    Every coverage.py report analyzes each source file again (parsing it,
+    computing statements, missing lines and branches). As the data doesn't
+    change, we cache those analyses so that the reports generated from this
+    object only analyze each file once.
+    """
+    with contextlib.chdir(coverage_path):
+        cov = coveragepy.Coverage()
+        cov.load()
+
+        analyze = cov._analyze
+        analyses: dict[Any, Analysis] = {}
+
+        def cached_analyze(morf, **kwargs):
+            if morf not in analyses:
+                analyses[morf] = analyze(morf, **kwargs)
+            return analyses[morf]
+
+        cov._analyze = cached_analyze  # type: ignore[method-assign,assignment]
+        yield cov
+
+
+def get_coverage_json(
+    cov: coveragepy.Coverage, only_files: set[str] | None = None
+) -> dict:
+    """
+    If `only_files` is given, the line data of the other files is left out
+    (they're still analyzed, for the totals).
+    """
+    branch_coverage = cov.get_data().has_arcs()
+
+    files = {}
+    totals = Numbers(precision=cov.config.precision)
+    for file_reporter, analysis in report_core.get_analysis_to_report(cov, morfs=None):
+        totals += analysis.numbers
+        filename = file_reporter.relative_filename()
+        if only_files is not None and filename not in only_files:
+            continue
+        files[filename] = {
+            "executed_lines": sorted(analysis.executed),
+            "summary": get_summary(
+                numbers=analysis.numbers, branch_coverage=branch_coverage
+            ),
+            "missing_lines": sorted(analysis.missing),
+            "excluded_lines": sorted(analysis.excluded),
+        }
+        if branch_coverage:
+            files[filename]["missing_branches"] = [
+                [source, destination]
+                for source, destinations in analysis.missing_branch_arcs().items()
+                for destination in destinations
+            ]
+
+    return {
+        "meta": {
+            "version": coveragepy.__version__,
+            "timestamp": datetime.datetime.now().isoformat(),
+            "branch_coverage": branch_coverage,
+            "show_contexts": cov.config.json_show_contexts,
+        },
+        "files": files,
+        "totals": get_summary(numbers=totals, branch_coverage=branch_coverage),
+    }
+
+
+def read_coverage_database(
+    coverage_path: pathlib.Path, only_files: set[str] | None = None
+) -> dict:
+    """
+    Build the same data as `generate_coverage_json`, but read the executed lines
+    straight from the .coverage SQLite database, decoding the numbits blobs
+    ourselves. The source files are still analyzed with coverage.py in order to
+    know which lines are statements and which are excluded.
+
+    Only line data is supported: branch data, plugins and the report filtering
+    options raise UnsupportedCoverageData.
+    """
+    with contextlib.chdir(coverage_path):
+        cov = coveragepy.Coverage()
+        config = cov.config
+        if config.report_include or config.report_omit or config.report_contexts:
+            raise UnsupportedCoverageData("Report filtering options are used")
+        # File reporters compute relative filenames from this directory. It's
+        # usually set when loading the data, which we don't do.
+        coverage_files.set_relative_directory()
+
+        executed_lines = read_executed_lines(
+            data_file=pathlib.Path(config.data_file).resolve()
+        )
+
+        files = {}
+        totals = Numbers(precision=config.precision)
+        for filename in sorted(executed_lines):
+            file_reporter = PythonFileReporter(morf=filename, coverage=cov)
+            statements = file_reporter.lines()
+            excluded = file_reporter.excluded_lines()
+            executed = (
+                file_reporter.translate_lines(executed_lines[filename]) & statements
+            )
+            missing = statements - executed
+            numbers = Numbers(
+                precision=config.precision,
+                n_files=1,
+                n_statements=len(statements),
+                n_excluded=len(excluded),
+                n_missing=len(missing),
+            )
+            totals += numbers
+            relative_filename = file_reporter.relative_filename()
+            if only_files is not None and relative_filename not in only_files:
+                continue
+            files[relative_filename] = {
+                "executed_lines": sorted(executed),
+                "summary": get_summary(numbers=numbers, branch_coverage=False),
+                "missing_lines": sorted(missing),
+                "excluded_lines": sorted(excluded),
+            }
+
+        return {
+            "meta": {
+                "version": coveragepy.__version__,
+                "timestamp": datetime.datetime.now().isoformat(),
+                "branch_coverage": False,
+                "show_contexts": config.json_show_contexts,
+            },
+            "files": files,
+            "totals": get_summary(numbers=totals, branch_coverage=False),
+        }
+
+
+def read_executed_lines(data_file: pathlib.Path) -> dict[str, set[int]]:
+    """
+    Read a .coverage file and return the executed lines for each measured file.
+    The database is opened read-only. Line numbers are stored as "numbits" (see
+    `decode_numbits`), one blob per file and per context, which we merge.
+    """
+    if not data_file.exists():
+        raise UnsupportedCoverageData(f"No coverage data file at {data_file}")
+
+    uri = f"{data_file.as_uri()}?mode=ro"
+    with contextlib.closing(sqlite3.connect(uri, uri=True)) as db:
+        try:
+            (version,) = db.execute("SELECT version FROM coverage_schema").fetchone()
+            if version != COVERAGE_SCHEMA_VERSION:
+                raise UnsupportedCoverageData(f"Unknown schema version {version}")
+            if db.execute("SELECT 1 FROM arc LIMIT 1").fetchone():
+                raise UnsupportedCoverageData("Branch coverage data")
+            if db.execute("SELECT 1 FROM tracer WHERE tracer != '' LIMIT 1").fetchone():
+                raise UnsupportedCoverageData("Coverage plugins data")
+
+            bits: dict[str, int] = {}
+            # Files that were measured but never ran (e.g. with `[run] source`)
+            # have no line_bits: they have no executed lines.
+            for path, numbits in db.execute(
+                "SELECT file.path, line_bits.numbits "
+                "FROM file LEFT JOIN line_bits ON file.id = line_bits.file_id"
+            ):
+                bits[path] = bits.get(path, 0) | int.from_bytes(
+                    numbits or b"", "little"
+                )
+        except sqlite3.DatabaseError as exc:
+            raise UnsupportedCoverageData(f"Cannot read {data_file}: {exc}") from exc
+
+    return {path: set(decode_numbits(value)) for path, value in bits.items()}
+
+
+# For each possible byte value, the positions of the bits that are set
+_BYTE_BITS = [
+    tuple(bit for bit in range(8) if byte & (1 << bit)) for byte in range(256)
+]
+
+
+def encode_numbits(lines: Iterable[int]) -> int:
+    """
+    The reverse of `decode_numbits`.
+        [1, 2, 5] -> 0b100110
+    """
+    buffer = bytearray(max(lines, default=0) // 8 + 1)
+    for line in lines:
+        buffer[line >> 3] |= 1 << (line & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def encode_numbits_intervals(intervals: LineIntervals) -> int:
+    """
+    Same as `encode_numbits`, but a whole interval is set at once.
+        [(1, 3), (5, 6)] -> 0b100110
+    """
+    numbits = 0
+    for start, end in intervals:
+        numbits |= ((1 << (end - start)) - 1) << start
+    return numbits
+
+
+def decode_numbits(numbits: int) -> list[int]:
+    """
+    Numbits are coverage.py's way of storing a set of integers: the integer n is
+    in the set if the bit n is set (bytes being little endian). We work on the
+    whole blob as a Python int so that merging blobs is a simple `|`.
+        0b100110 -> [1, 2, 5]
+    """
+    result: list[int] = []
+    for index, byte in enumerate(
+        numbits.to_bytes((numbits.bit_length() + 7) // 8, "little")
+    ):
+        if byte:
+            base = index * 8
+            result.extend(base + bit for bit in _BYTE_BITS[byte])
+    return result
+
+
+def get_summary(numbers: Numbers, branch_coverage: bool) -> dict:
+    """
+    Same as the "summary" and "totals" sections of `coverage json`
+    """
+    summary = {
+        "covered_lines": numbers.n_executed,
+        "num_statements": numbers.n_statements,
+        "percent_covered": numbers.pc_covered,
+        "percent_covered_display": numbers.pc_covered_str,
+        "missing_lines": numbers.n_missing,
+        "excluded_lines": numbers.n_excluded,
+    }
+    if branch_coverage:
+        summary |= {
+            "num_branches": numbers.n_branches,
+            "num_partial_branches": numbers.n_partial_branches,
+            "covered_branches": numbers.n_executed_branches,
+            "missing_branches": numbers.n_missing_branches,
+        }
+    return summary
 
 
 def generate_coverage_html_files(
@@ -172,42 +1070,10 @@ def extract_info(data: dict, coverage_path: pathlib.Path) -> Coverage:
             branch_coverage=data["meta"]["branch_coverage"],
             show_contexts=data["meta"]["show_contexts"],
         ),
-        files={
-            coverage_path / path: FileCoverage(
-                path=coverage_path / path,
-                excluded_lines=file_data["excluded_lines"],
-                executed_lines=file_data["executed_lines"],
-                missing_lines=file_data["missing_lines"],
-                info=CoverageInfo(
-                    covered_lines=file_data["summary"]["covered_lines"],
-                    num_statements=file_data["summary"]["num_statements"],
-                    percent_covered=compute_coverage(
-                        file_data["summary"]["covered_lines"]
-                        + file_data["summary"].get("covered_branches", 0),
-                        file_data["summary"]["num_statements"]
-                        + file_data["summary"].get("num_branches", 0),
-                    ),
-                    missing_lines=file_data["summary"]["missing_lines"],
-                    excluded_lines=file_data["summary"]["excluded_lines"],
-                    num_branches=file_data["summary"].get("num_branches"),
-                    num_partial_branches=file_data["summary"].get(
-                        "num_partial_branches"
-                    ),
-                    covered_branches=file_data["summary"].get("covered_branches"),
-                    missing_branches=file_data["summary"].get("missing_branches"),
-                ),
-            )
-            for path, file_data in data["files"].items()
-        },
+        files=FileCoverages(files_data=data["files"], coverage_path=coverage_path),
         info=CoverageInfo(
             covered_lines=data["totals"]["covered_lines"],
             num_statements=data["totals"]["num_statements"],
-            percent_covered=compute_coverage(
-                data["totals"]["covered_lines"]
-                + data["totals"].get("covered_branches", 0),
-                data["totals"]["num_statements"]
-                + data["totals"].get("num_branches", 0),
-            ),
             missing_lines=data["totals"]["missing_lines"],
             excluded_lines=data["totals"]["excluded_lines"],
             num_branches=data["totals"].get("num_branches"),
@@ -218,27 +1084,61 @@ def extract_info(data: dict, coverage_path: pathlib.Path) -> Coverage:
     )
 
 
+def extract_file_info(path: pathlib.Path, file_data: dict) -> FileCoverage:
+    return FileCoverage(
+        path=path,
+        excluded_lines=file_data["excluded_lines"],
+        executed_lines=file_data["executed_lines"],
+        missing_lines=file_data["missing_lines"],
+        missing_branches=file_data.get("missing_branches", ()),
+        info=CoverageInfo(
+            covered_lines=file_data["summary"]["covered_lines"],
+            num_statements=file_data["summary"]["num_statements"],
+            missing_lines=file_data["summary"]["missing_lines"],
+            excluded_lines=file_data["summary"]["excluded_lines"],
+            num_branches=file_data["summary"].get("num_branches"),
+            num_partial_branches=file_data["summary"].get("num_partial_branches"),
+            covered_branches=file_data["summary"].get("covered_branches"),
+            missing_branches=file_data["summary"].get("missing_branches"),
+        ),
+    )
+
+
 def get_diff_coverage_info(
-    added_lines: dict[pathlib.Path, list[int]], coverage: Coverage
+    added_lines: dict[str, LineIntervals],
+    coverage: Coverage,
+    engine: str = INTERVALS_DIFF_ENGINE,
 ) -> DiffCoverage:
+    if engine not in DIFF_COVERAGE_ENGINES:
+        raise ValueError(f"Unknown diff coverage engine: {engine}")
+    intersect = (
+        intersect_numbits if engine == NUMBITS_DIFF_ENGINE else intersect_intervals
+    )
+
     files = {}
     total_num_lines = 0
     total_num_violations = 0
     num_changed_lines = 0
 
-    for path, added_lines_for_file in added_lines.items():
-        num_changed_lines += len(added_lines_for_file)
+    for path, added_intervals in added_lines.items():
+        num_changed_lines += sum(end - start for start, end in added_intervals)
 
         try:
             file = coverage.files[path]
         except KeyError:
             continue
 
-        executed = set(file.executed_lines) & set(added_lines_for_file)
-        count_executed = len(executed)
-
-        missing = set(file.missing_lines) & set(added_lines_for_file)
+        count_executed, missing = intersect(added_intervals, file)
         count_missing = len(missing)
+        # Like coverage's own report, a branch to or from a missing line isn't
+        # listed: the missing line already says it all.
+        missing_branches = [
+            (source, destination)
+            for start, end in added_intervals
+            for source, destination in file.missing_branches.between(start, end)
+            if source not in file.missing_lines
+            and destination not in file.missing_lines
+        ]
         # Even partially covered lines are considered as covered, no line
         # appears in both counts
         count_total = count_executed + count_missing
@@ -246,59 +1146,287 @@ def get_diff_coverage_info(
         total_num_lines += count_total
         total_num_violations += count_missing
 
-        percent_covered = compute_coverage(
-            num_covered=count_executed, num_total=count_total
+        # Only the files we report on get a Path
+        file_path = pathlib.Path(path)
+        files[file_path] = FileDiffCoverage(
+            path=file_path,
+            covered_lines=count_executed,
+            num_lines=count_total,
+            violation_lines=missing,
+            missing_branches=missing_branches,
         )
 
-        files[path] = FileDiffCoverage(
-            path=path,
-            percent_covered=percent_covered,
-            violation_lines=sorted(missing),
-        )
-    final_percentage = compute_coverage(
-        num_covered=total_num_lines - total_num_violations,
-        num_total=total_num_lines,
-    )
-
     return DiffCoverage(
         total_num_lines=total_num_lines,
         total_num_violations=total_num_violations,
-        total_percent_covered=final_percentage,
         num_changed_lines=num_changed_lines,
         files=files,
     )
 
 
+def intersect_intervals(
+    added_intervals: LineIntervals, file: FileCoverage
+) -> tuple[int, list[int]]:
+    """
+    Return the number of executed lines and the (sorted) missing lines among
+    the added ones. Each added interval is intersected with the sorted lines
+    with binary searches, so large hunks don't cost more than small ones.
+    """
+    count_executed = 0
+    missing: list[int] = []
+    for start, end in added_intervals:
+        count_executed += len(file.executed_lines.between(start, end))
+        missing.extend(file.missing_lines.between(start, end))
+    return count_executed, missing
+
+
+def intersect_numbits(
+    added_intervals: LineIntervals, file: FileCoverage
+) -> tuple[int, list[int]]:
+    """
+    Same as `intersect_intervals`, with numbits: intersecting and counting are
+    bitwise operations on whole ints, but encoding the lines of the file takes
+    a pass over them.
+    """
+    added = encode_numbits_intervals(added_intervals)
+    executed = encode_numbits(file.executed_lines)
+    missing = encode_numbits(file.missing_lines)
+    return (added & executed).bit_count(), decode_numbits(added & missing)
+
+
 def get_added_lines(
-    git: subprocess.Git, base_ref: str
-) -> dict[pathlib.Path, list[int]]:
+    git: subprocess.Git,
+    base_ref: str,
+    pathspec: Sequence[str] | None = None,
+    cache_dir: pathlib.Path | None = None,
+) -> dict[str, LineIntervals]:
+    """
+    `pathspec` restricts the diff to some files (see `git help glossary`), e.g.
+    those that can be in the coverage data (see `get_measured_directories`).
+    If `cache_dir` is set, the result is cached for the commits being compared,
+    so re-runs don't fetch anything.
+    """
+    pathspec = pathspec or [os.curdir]
+    cache_key = None
+    if cache_dir:
+        cache_key = get_diff_cache_key(git=git, base_ref=base_ref, pathspec=pathspec)
+    if cache_dir and cache_key:
+        cached = cache.read_json(cache_dir=cache_dir, namespace="diff", key=cache_key)
+        if cached is not None:
+            log.info(f"Using cached diff with {base_ref}")
+            # JSON doesn't have tuples
+            return {
+                path: [(start, end) for start, end in intervals]
+                for path, intervals in cached.items()
+            }
+
     # --unified=0 means we don't get any context lines for chunk, and we
     # don't merge chunks. This means the headers that describe line number
     # are always enough to derive what line numbers were added.
-    git.fetch("origin", base_ref, "--depth=1000")
-    diff = git.diff("--unified=0", "FETCH_HEAD", "--", ".")
-    return parse_diff_output(diff)
+    merge_base = fetch_merge_base(git=git, base_ref=base_ref)
+    # The diff can be huge (e.g. generated files): parse it as git outputs it
+    # rather than loading it whole.
+    diff_lines = git.stream("diff", "--unified=0", merge_base, "--", *pathspec)
+    added_lines = parse_diff_output(diff_lines)
+
+    if cache_dir and cache_key:
+        cache.write_json(
+            cache_dir=cache_dir, namespace="diff", key=cache_key, value=added_lines
+        )
+    return added_lines
+
+
+def get_diff_cache_key(
+    git: subprocess.Git, base_ref: str, pathspec: Sequence[str]
+) -> str | None:
+    """
+    The diff only depends on the commit of HEAD, the commit at the tip of
+    `base_ref` (which ls-remote gives without fetching anything) and the
+    pathspec. Returns None if the commits can't be resolved, so as not to
+    cache anything.
+    """
+    try:
+        head = git.rev_parse("HEAD").strip()
+        remote_refs = git.ls_remote("origin", f"refs/heads/{base_ref}").split()
+    except subprocess.GitError:
+        log.debug("Cannot compute the diff cache key", exc_info=True)
+        return None
+    if not remote_refs:
+        log.debug(f"Cannot find {base_ref} on the remote")
+        return None
+    return cache.get_key(remote_refs[0], head, *pathspec)
+
+
+def get_measured_directories(
+    coverage_path: pathlib.Path, merge: bool
+) -> list[str] | None:
+    """
+    The directories of the files measured in the coverage data files, relative
+    to the current directory (none of them being below another one). Only
+    changes to files in those directories can have coverage data.
+    Returns None if they can't be known or if it's the whole repository.
+    """
+    directories: set[str] = set()
+    with contextlib.chdir(coverage_path):
+        config = coveragepy.Coverage().config
+        if merge:
+            data_files = combinable_files(data_file=config.data_file)
+        else:
+            data_files = [config.data_file]
+        try:
+            for data_file in data_files:
+                data = coveragepy.CoverageData(basename=data_file)
+                data.read()
+                directories.update(
+                    # Relative paths (with `relative_files`) are relative to
+                    # where coverage ran
+                    os.path.dirname(os.path.abspath(path))
+                    for path in data.measured_files()
+                )
+        except coveragepy.CoverageException:
+            log.debug("Cannot read the measured files", exc_info=True)
+            return None
+
+    result: set[str] = set()
+    for directory in sorted(
+        normalize_path(os.path.relpath(directory)) for directory in directories
+    ):
+        # Either the whole repository, or files that are not in it (e.g.
+        # measured on another machine)
+        if directory == os.curdir or directory.split(os.sep)[0] == os.pardir:
+            return None
+        # Sorting puts parents before their children
+        parents = {str(parent) for parent in pathlib.PurePath(directory).parents}
+        if parents.isdisjoint(result):
+            result.add(directory)
+    return sorted(result) or None
+
+
+def fetch_merge_base(git: subprocess.Git, base_ref: str) -> str:
+    """
+    Fetch as little as possible of the history of `base_ref` to find where HEAD
+    branched off it: no blobs (git fetches the few the diff needs on demand),
+    and only as deep as needed. If HEAD comes from a shallow clone, its own
+    history is deepened along.
+    Falls back to the tip of `base_ref` if the histories don't meet.
+    """
+    is_shallow, head = git.rev_parse("--is-shallow-repository", "HEAD").split()
+    refs = [base_ref, head] if is_shallow == "true" else [base_ref]
+    size_before = get_objects_size(git=git)
+
+    depth = FETCH_DEPTH
+    merge_base = None
+    fetches = 0
+    while merge_base is None and fetches < MAX_FETCHES:
+        deepen = f"--depth={depth}" if fetches == 0 else f"--deepen={depth}"
+        git.fetch("--filter=blob:none", deepen, "origin", *refs)
+        fetches += 1
+        depth *= 2
+        try:
+            # FETCH_HEAD is base_ref, the first ref we fetched
+            merge_base = git.merge_base("FETCH_HEAD", "HEAD").strip()
+        except subprocess.GitError:
+            log.debug(f"No merge base with {base_ref} after {fetches} fetches")
+
+    size = get_objects_size(git=git) - size_before
+    log.info(f"Fetched {base_ref} in {fetches} round trips, downloading {size} KiB")
+    if merge_base is None:
+        log.warning(
+            f"Could not find where HEAD branched off {base_ref}, "
+            f"computing the diff with the tip of {base_ref} instead."
+        )
+        return "FETCH_HEAD"
+    return merge_base
+
+
+def get_objects_size(git: subprocess.Git) -> int:
+    """
+    Disk size of the objects of the repository, in KiB (loose objects and packs)
+    """
+    counts = dict(line.split(": ", 1) for line in git.count_objects("-v").splitlines())
+    return int(counts.get("size", 0)) + int(counts.get("size-pack", 0))
 
 
-def parse_diff_output(diff: str) -> dict[pathlib.Path, list[int]]:
-    current_file: pathlib.Path | None = None
+def parse_diff_output(diff_lines: Iterable[str]) -> dict[str, LineIntervals]:
+    """
+    Only the filename and hunk header lines are used, the other lines are
+    dropped as they are read. Hunks are in order in the diff, so the intervals
+    of each file are sorted.
+    """
+    current_file: str | None = None
     added_filename_prefix = "+++ b/"
-    result: dict[pathlib.Path, list[int]] = {}
-    for line in diff.splitlines():
+    result: dict[str, LineIntervals] = {}
+    for line in diff_lines:
         if line.startswith(added_filename_prefix):
-            current_file = pathlib.Path(line.removeprefix(added_filename_prefix))
+            current_file = normalize_path(
+                line.removeprefix(added_filename_prefix).rstrip("\n")
+            )
             continue
         if line.startswith("@@"):
             lines = parse_line_number_diff_line(line)
             if len(lines) > 0:
                 if current_file is None:
-                    raise ValueError(f"Unexpected diff output format: \n{diff}")
-                result.setdefault(current_file, []).extend(lines)
+                    raise ValueError(f"Unexpected diff output format: \n{line}")
+                result.setdefault(current_file, []).append((lines.start, lines.stop))
 
     return result
 
 
-def parse_line_number_diff_line(line: str) -> Iterable[int]:
+def get_pr_added_lines(
+    pr_files: Iterable[Mapping[str, Any]], git: subprocess.Git, base_ref: str
+) -> dict[str, LineIntervals]:
+    """
+    Same as `get_added_lines`, from the files of a PR as listed by the GitHub
+    API (see `github.get_pr_files`). The API omits the patch of files whose diff
+    is too large: those are diffed with git.
+    """
+    result: dict[str, LineIntervals] = {}
+    truncated = []
+    for pr_file in pr_files:
+        patch = pr_file.get("patch")
+        if patch is None:
+            # Binary files don't have a patch either, but no additions
+            if pr_file["additions"]:
+                truncated.append(pr_file["filename"])
+            continue
+        intervals = parse_patch(patch)
+        if intervals:
+            result[normalize_path(pr_file["filename"])] = intervals
+
+    if truncated:
+        log.info(
+            f"The GitHub API doesn't give the patch of {len(truncated)} files, "
+            "computing their diff with git"
+        )
+        pathspec = [f":(literal){filename}" for filename in truncated]
+        result |= get_added_lines(git=git, base_ref=base_ref, pathspec=pathspec)
+    return result
+
+
+def parse_patch(patch: str) -> LineIntervals:
+    """
+    Parse the patch of a file as given by the GitHub API. Unlike our diffs, its
+    hunks have context lines, so we count the lines of each hunk.
+    """
+    intervals: LineIntervals = []
+    line_number = 0
+    for line in patch.split("\n"):
+        if line.startswith("@@"):
+            line_number = parse_line_number_diff_line(line).start
+        elif line.startswith("+"):
+            if intervals and intervals[-1][1] == line_number:
+                intervals[-1] = (intervals[-1][0], line_number + 1)
+            else:
+                intervals.append((line_number, line_number + 1))
+            line_number += 1
+        elif line.startswith(" "):
+            line_number += 1
+        # Removed lines and "\ No newline at end of file" don't count
+
+    return intervals
+
+
+def parse_line_number_diff_line(line: str) -> range:
     """
     Parse the "added" part of the line number diff text:
         @@ -60,0 +61 @@ def compute_files(  -> [61]
@@ -15,7 +15,7 @@ from typing import Protocol, TypedDict
 
 import httpx
 
-from coverage_comment import badge, coverage, log
+from coverage_comment import badge, log
 
 ENDPOINT_PATH = pathlib.Path("endpoint.json")
 DATA_PATH = pathlib.Path("data.json")
@@ -104,7 +104,9 @@ def compute_datafile(
             "coverage": float(line_rate),
             "raw_data": raw_coverage_data,
             "coverage_path": str(coverage_path),
-        }
+        },
+        # Line numbers may be stored as (list-like) LineNumbers
+        default=list,
     )
 
 
@@ -128,13 +130,17 @@ def get_urls(url_getter: Callable) -> ImageURLs:
     }
 
 
-def get_coverage_html_files(
-    *, coverage_path: pathlib.Path, gen_dir: pathlib.Path = pathlib.Path("/tmp")
-) -> ReplaceDir:
-    html_dir = pathlib.Path(tempfile.mkdtemp(dir=gen_dir))
-    coverage.generate_coverage_html_files(
-        destination=html_dir, coverage_path=coverage_path
-    )
+def make_html_dir(gen_dir: pathlib.Path = pathlib.Path("/tmp")) -> pathlib.Path:
+    """
+    Temporary directory in which to generate the HTML report
+    """
+    return pathlib.Path(tempfile.mkdtemp(dir=gen_dir))
+
+
+def get_coverage_html_files(*, html_dir: pathlib.Path) -> ReplaceDir:
+    """
+    Operation moving the HTML report generated in `html_dir` to its final place
+    """
     dest = pathlib.Path("htmlcov")
     # Coverage may or may not create a .gitignore.
     (html_dir / ".gitignore").unlink(missing_ok=True)
@@ -3,14 +3,19 @@ from __future__ import annotations
 import dataclasses
 import io
 import json
+import math
 import pathlib
 import sys
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 
 from coverage_comment import github_client, log
 
 GITHUB_ACTIONS_LOGIN = "github-actions[bot]"
 MISSING_COVERAGE_MESSAGE = "This line has no coverage"
+# The pull request files endpoint lists at most 3000 files, 100 per page
+PR_FILES_PER_PAGE = 100
+MAX_PR_FILES = 3000
 
 
 class CannotDeterminePR(Exception):
@@ -25,6 +30,14 @@ class NoArtifact(Exception):
     pass
 
 
+class TooManyPRFiles(Exception):
+    pass
+
+
+class PRHeadMismatch(Exception):
+    pass
+
+
 @dataclasses.dataclass
 class RepositoryInfo:
     default_branch: str
@@ -120,6 +133,43 @@ def find_pr_for_branch(
         raise CannotDeterminePR(f"No open PR found for branch {branch}")
 
 
+def get_pr_files(
+    github: github_client.GitHub,
+    repository: str,
+    pr_number: int,
+    head_sha: str,
+    workers: int = 4,
+) -> list[github_client.JsonObject]:
+    """
+    The files changed by the PR, with their patch. The number of changed files
+    tells us the number of pages, so they are all fetched concurrently.
+
+    The line numbers of the patches are those of the head commit of the PR: if
+    `head_sha` (the commit we measured) is another one, such as the merge
+    commit that `actions/checkout` checks out by default, they may not match.
+    """
+    pr_path = github.repos(repository).pulls(pr_number)
+    pull = pr_path.get()
+    if pull.head.sha != head_sha:
+        raise PRHeadMismatch(
+            f"The checked out commit {head_sha} is not the head of the PR "
+            f"({pull.head.sha})"
+        )
+    num_files = pull.changed_files
+    if num_files > MAX_PR_FILES:
+        raise TooManyPRFiles(
+            f"The PR changes {num_files} files, the API lists at most {MAX_PR_FILES}"
+        )
+
+    def get_page(page: int) -> list[github_client.JsonObject]:
+        return pr_path.files.get(per_page=PR_FILES_PER_PAGE, page=page)
+
+    num_pages = max(1, math.ceil(num_files / PR_FILES_PER_PAGE))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pages = executor.map(get_page, range(1, num_pages + 1))
+        return [pr_file for page in pages for pr_file in page]
+
+
 def get_my_login(github: github_client.GitHub) -> str:
     try:
         response = github.user.get()
@@ -144,7 +194,8 @@ def post_comment(
     issue_comments_path = github.repos(repository).issues(pr_number).comments
     comments_path = github.repos(repository).issues.comments
 
-    for comment in issue_comments_path.get():
+    # Comments are listed oldest first, ours is likely on the first page
+    for comment in issue_comments_path.paginate():
         if comment.user.login == me and marker in comment.body:
             log.info("Update previous comment")
             try:
@@ -160,7 +211,7 @@ def post_comment(
             raise CannotPostComment from exc
 
 
-def set_output(github_output: pathlib.Path | None, **kwargs: bool) -> None:
+def set_output(github_output: pathlib.Path | None, **kwargs: bool | int) -> None:
     if github_output:
         with github_output.open("a") as f:
             for key, value in kwargs.items():
@@ -11,9 +11,46 @@ from __future__ import annotations
 
 __version__ = "1.1.1"
 
+import base64
+import collections
+import itertools
+import json
+import pathlib
+import random
+import threading
+import time
+from collections.abc import Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any
+
 import httpx
 
+from coverage_comment import cache, log
+
 TIMEOUT = 60
+# What we need to rebuild a cached response, and to revalidate it
+CACHED_HEADERS = ("content-type", "etag", "last-modified", "link")
+# The maximum allowed by the API
+PER_PAGE = 100
+# GitHub recommends waiting a second between mutative requests, to avoid
+# secondary rate limits
+MUTATION_INTERVAL = 1
+# In seconds. Past that, we'd rather fail than have the job hang.
+MAX_RATE_LIMIT_WAIT = 300
+MAX_RATE_LIMIT_RETRIES = 3
+# Below that many remaining requests, they are spread until the limit resets
+LOW_RATE_LIMIT = 100
+MAX_PACING_INTERVAL = 1
+# GitHub asks to wait at least a minute after hitting a secondary rate limit
+# if it doesn't say how long
+SECONDARY_RATE_LIMIT_WAIT = 60
+# Transient errors are retried for requests that can be repeated safely (we
+# only PATCH comments, with their whole body)
+IDEMPOTENT_METHODS = ("GET", "PATCH")
+RETRY_STATUSES = (500, 502, 503, 504)
+# In seconds
+BACKOFF_BASE = 1
+MAX_BACKOFF = 30
 
 _URL = "https://api.github.com"
 
@@ -45,6 +82,9 @@ class _Callable:
         name = f"{self._name}/{attr}"
         return _Callable(self._gh, name)
 
+    def paginate(self, **kw):
+        return self._gh._paginate(self._name, **kw)
+
 
 class GitHub:
 
@@ -52,13 +92,71 @@ class GitHub:
     GitHub client.
     """
 
-    def __init__(self, session: httpx.Client):
+    def __init__(
+        self,
+        session: httpx.Client,
+        cache_dir: pathlib.Path | None = None,
+        retries: int = 3,
+        retry_budget: float = 120,
+    ):
         self.session = session
+        # If set, GET responses are cached there and revalidated with
+        # conditional requests: 304 responses don't count in the rate limit.
+        self.cache_dir = cache_dir
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # As of the last response, None until we know
+        self.rate_limit_remaining: int | None = None
+        self._rate_limit_reset = 0.0
+        # No request is sent before those (UNIX) times
+        self._resume_at = 0.0
+        self._next_request_at = 0.0
+        self._next_mutation_at = 0.0
+        # Transient errors are retried `retries` times per request, as long as
+        # less than `retry_budget` seconds were spent on retries in total
+        self.retries = retries
+        self.retry_budget = retry_budget
+        self._retry_time = 0.0
+        self._lock = threading.Lock()
 
     def __getattr__(self, attr):
         return _Callable(self, "/%s" % attr)
 
     def _http(self, method, path, *, bytes=False, **kw):
+        _, contents = self._request(method, path, bytes=bytes, **kw)
+        return contents
+
+    def _paginate(
+        self, path, *, per_page=PER_PAGE, workers=4, **kw
+    ) -> Iterator[JsonObject]:
+        """
+        Iterate over the items of all the pages of a list endpoint. The first
+        page tells how many there are, then the others are fetched concurrently,
+        `workers` pages ahead of the iteration, so that stopping it early spares
+        the requests for the remaining pages.
+        """
+        response, contents = self._request("get", path, per_page=per_page, page=1, **kw)
+        yield from contents
+
+        pages = iter(range(2, get_last_page(response) + 1))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+
+            def fetch_next(count: int) -> None:
+                for page in itertools.islice(pages, count):
+                    futures.append(
+                        executor.submit(
+                            self._http, "get", path, per_page=per_page, page=page, **kw
+                        )
+                    )
+
+            futures: collections.deque[Future] = collections.deque()
+            fetch_next(count=workers)
+            while futures:
+                contents = futures.popleft().result()
+                fetch_next(count=1)
+                yield from contents
+
+    def _request(self, method, path, *, bytes=False, **kw):
         _method = method.lower()
         requests_kwargs = {}
         if _method == "get" and kw:
@@ -67,12 +165,25 @@ class GitHub:
         elif _method in ["post", "patch", "put"]:
             requests_kwargs = {"json": kw}
 
-        response = self.session.request(
+        cache_key = cached = None
+        if _method == "get" and not bytes and self.cache_dir:
+            cache_key = cache.get_key(path, json.dumps(kw, sort_keys=True))
+            cached = cache.read_json(
+                cache_dir=self.cache_dir, namespace="http", key=cache_key
+            )
+            if cached:
+                requests_kwargs["headers"] = get_validators(headers=cached["headers"])
+
+        response = self._send(
             _method.upper(),
             path,
             timeout=TIMEOUT,
             **requests_kwargs,
         )
+        if cache_key:
+            response = self._revalidate(
+                response=response, cache_key=cache_key, cached=cached
+            )
         if bytes:
             contents = response.content
         else:
@@ -88,7 +199,193 @@ class GitHub:
 
             raise cls(str(contents)) from exc
 
-        return contents
+        return response, contents
+
+    def _send(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """
+        Send the request when the rate limits allow it, and send it again if it
+        was rejected because of them, or if it failed transiently and can be
+        repeated safely (see `_get_retry_delay`).
+        """
+        rate_limited = retries = 0
+        while True:
+            self._wait_for_rate_limit(method=method)
+            start = time.monotonic()
+            try:
+                response = self.session.request(method, path, **kwargs)
+            except httpx.TransportError as exc:
+                delay = self._get_retry_delay(
+                    method=method, retries=retries, start=start
+                )
+                if delay is None:
+                    raise
+                error = f"{type(exc).__name__}: {exc}"
+            else:
+                if self._read_rate_limit(response=response):
+                    rate_limited += 1
+                    if rate_limited > MAX_RATE_LIMIT_RETRIES:
+                        raise RateLimited(
+                            f"{method} {path} was rate limited by GitHub "
+                            f"{rate_limited} times"
+                        )
+                    log.info(
+                        f"{method} {path} was rate limited by GitHub, "
+                        f"retrying ({rate_limited}/{MAX_RATE_LIMIT_RETRIES})"
+                    )
+                    continue
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                delay = self._get_retry_delay(
+                    method=method, retries=retries, start=start
+                )
+                if delay is None:
+                    return response
+                error = f"HTTP {response.status_code}"
+
+            retries += 1
+            log.warning(
+                f"{method} {path} failed after {time.monotonic() - start:.1f}s "
+                f"({error}), retrying in {delay:.1f}s ({retries}/{self.retries})"
+            )
+            time.sleep(delay)
+
+    def _get_retry_delay(self, method: str, retries: int, start: float) -> float | None:
+        """
+        The delay before retrying a request that failed transiently, with an
+        exponential backoff and full jitter. Returns None if it shouldn't be
+        retried: it might not be safe, there were too many retries, or the time
+        spent on retries during the run would exceed the budget.
+        """
+        if method not in IDEMPOTENT_METHODS or retries >= self.retries:
+            return None
+        delay = random.uniform(0, min(MAX_BACKOFF, BACKOFF_BASE * 2**retries))
+        with self._lock:
+            # Both the failed attempt and the wait count
+            spent = time.monotonic() - start + delay
+            if self._retry_time + spent > self.retry_budget:
+                log.warning("The time budget for retrying requests is exhausted")
+                return None
+            self._retry_time += spent
+        return delay
+
+    def _wait_for_rate_limit(self, method: str) -> None:
+        with self._lock:
+            now = time.time()
+            # Only an exhausted budget (or GitHub asking us to wait) can make us
+            # wait that long: the pacing below is capped.
+            if self._resume_at - now > MAX_RATE_LIMIT_WAIT:
+                raise RateLimited(
+                    "The GitHub API rate limit allows no request for "
+                    f"{self._resume_at - now:.0f}s"
+                )
+            start = max(now, self._resume_at, self._next_request_at)
+            if method != "GET":
+                start = max(start, self._next_mutation_at)
+                self._next_mutation_at = start + MUTATION_INTERVAL
+            self._next_request_at = start + self._get_request_interval(now=now)
+
+        delay = start - now
+        if delay > 0:
+            log.debug(f"Waiting {delay:.1f}s before the next GitHub API request")
+            time.sleep(delay)
+
+    def _get_request_interval(self, now: float) -> float:
+        """
+        When the remaining budget runs low, slow down to spread the remaining
+        requests until the limit resets, but not by more than
+        MAX_PACING_INTERVAL between requests: the budget is shared, we can't
+        save it for later runs.
+        """
+        remaining = self.rate_limit_remaining
+        if remaining is None or remaining >= LOW_RATE_LIMIT:
+            return 0
+        interval = max(self._rate_limit_reset - now, 0) / max(remaining, 1)
+        return min(interval, MAX_PACING_INTERVAL)
+
+    def _read_rate_limit(self, response: httpx.Response) -> bool:
+        """
+        Keep track of the remaining budget of requests, and of when requests
+        can be sent again if it's exhausted. Returns whether the request was
+        rejected because of a (primary or secondary) rate limit.
+        """
+        headers = response.headers
+        with self._lock:
+            if "x-ratelimit-remaining" in headers:
+                self.rate_limit_remaining = int(headers["x-ratelimit-remaining"])
+            if "x-ratelimit-reset" in headers:
+                self._rate_limit_reset = float(headers["x-ratelimit-reset"])
+            exhausted = headers.get("x-ratelimit-remaining") == "0"
+            if exhausted:
+                self._resume_at = max(self._resume_at, self._rate_limit_reset)
+            if response.status_code not in (403, 429):
+                return False
+            if "retry-after" in headers:
+                wait = float(headers["retry-after"])
+            # Secondary rate limits don't always come with a Retry-After
+            elif "secondary rate limit" in response.text:
+                wait = SECONDARY_RATE_LIMIT_WAIT
+            else:
+                return exhausted
+            self._resume_at = max(self._resume_at, time.time() + wait)
+        return True
+
+    def _revalidate(
+        self, response: httpx.Response, cache_key: str, cached: Any | None
+    ) -> httpx.Response:
+        """
+        Rebuild the cached response if it's still valid, otherwise cache the new
+        one if it can be revalidated later.
+        """
+        assert self.cache_dir
+        if response.status_code == 304 and cached:
+            self.cache_hits += 1
+            return httpx.Response(
+                status_code=200,
+                headers=cached["headers"],
+                content=base64.b64decode(cached["content"]),
+                request=response.request,
+            )
+
+        self.cache_misses += 1
+        headers = {
+            name: response.headers[name]
+            for name in CACHED_HEADERS
+            if name in response.headers
+        }
+        if response.status_code == 200 and get_validators(headers=headers):
+            cache.write_json(
+                cache_dir=self.cache_dir,
+                namespace="http",
+                key=cache_key,
+                value={
+                    "headers": headers,
+                    "content": base64.b64encode(response.content).decode(),
+                },
+            )
+        return response
+
+
+def get_validators(headers: dict[str, str]) -> dict[str, str]:
+    """
+    Headers of a conditional request, from the headers of a previous response
+    """
+    validators = {}
+    if "etag" in headers:
+        validators["If-None-Match"] = headers["etag"]
+    if "last-modified" in headers:
+        validators["If-Modified-Since"] = headers["last-modified"]
+    return validators
+
+
+def get_last_page(response: httpx.Response) -> int:
+    """
+    The number of pages of a paginated endpoint, from the Link header of its
+    first page (there's none if there's only one page)
+    """
+    last = response.links.get("last")
+    if last is None:
+        return 1
+    return int(httpx.URL(last["url"]).params["page"])
 
 
 def response_contents(
@@ -121,3 +418,7 @@ class NotFound(ApiError):
 
 class Forbidden(ApiError):
     pass
+
+
+class RateLimited(ApiError):
+    pass
@@ -0,0 +1,102 @@
+"""
+A minimal incremental JSON reader: it walks through objects key by key and
+decodes each value with the standard json module, so that only the value being
+read is held in memory (both as text and decoded), instead of the whole
+document.
+"""
+from __future__ import annotations
+
+import json
+import re
+from collections.abc import Iterator
+from typing import IO, Any
+
+NON_WHITESPACE = re.compile(r"\S")
+NOT_NUMBER = re.compile(r"[^0-9.eE+-]")
+
+
+class JSONStreamReader:
+    def __init__(self, file: IO[str], chunk_size: int = 2**16):
+        self._file = file
+        self._chunk_size = chunk_size
+        self._buffer = ""
+        self._pos = 0
+        self._decoder = json.JSONDecoder()
+
+    def _read(self) -> bool:
+        """
+        Read the next chunk, dropping what was already consumed. Returns False
+        at the end of the file.
+        """
+        chunk = self._file.read(self._chunk_size)
+        if not chunk:
+            return False
+        self._buffer = self._buffer[self._pos :] + chunk
+        self._pos = 0
+        return True
+
+    def _peek(self) -> str:
+        """
+        Skip whitespace and return the next character ("" at the end of the
+        file) without consuming it.
+        """
+        while True:
+            match = NON_WHITESPACE.search(self._buffer, self._pos)
+            if match:
+                self._pos = match.start()
+                return match.group()
+            self._pos = len(self._buffer)
+            if not self._read():
+                return ""
+
+    def _expect(self, chars: str) -> str:
+        char = self._peek()
+        if not char or char not in chars:
+            raise json.JSONDecodeError(
+                f"Expecting one of {chars!r}", self._buffer, self._pos
+            )
+        self._pos += 1
+        return char
+
+    def read_value(self) -> Any:
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                # The value may continue in the next chunk
+                if not self._read():
+                    raise
+                continue
+            # A number is the only value that can be decoded successfully while
+            # cut (e.g. "12" from "123", "1" from "1.5"): make sure we have its
+            # end in the buffer.
+            if (
+                isinstance(value, int | float)
+                and not NOT_NUMBER.search(self._buffer, self._pos)
+                and self._read()
+            ):
+                continue
+            self._pos = end
+            return value
+
+    def iter_object_keys(self) -> Iterator[str]:
+        """
+        Iterate over the keys of the object starting at the current position.
+        After each key, the caller must consume the value, either with
+        `read_value` or, for a nested object, with `iter_object_keys`.
+        """
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.read_value()
+            if not isinstance(key, str):
+                raise json.JSONDecodeError(
+                    "Expecting property name", self._buffer, self._pos
+                )
+            self._expect(":")
+            yield key
+            if self._expect(",}") == "}":
+                return
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
+import decimal
 import functools
 import logging
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 import httpx
 
@@ -34,7 +36,7 @@ def main():
         config = settings.Config.from_environ(environ=os.environ)
 
         github_session = httpx.Client(
-            base_url="https://api.github.com",
+            base_url=config.GITHUB_API_URL,
             follow_redirects=True,
             headers={"Authorization": f"token {config.GITHUB_TOKEN}"},
         )
@@ -65,7 +67,33 @@ def action(
     git: subprocess.Git,
 ) -> int:
     log.debug(f"Operating on {config.GITHUB_REF}")
-    gh = github_client.GitHub(session=github_session)
+    gh = github_client.GitHub(
+        session=github_session,
+        cache_dir=config.CACHE_DIR,
+        retries=config.API_RETRIES,
+        retry_budget=config.API_RETRY_BUDGET,
+    )
+    try:
+        return run_activity(config=config, gh=gh, http_session=http_session, git=git)
+    finally:
+        if config.CACHE_DIR:
+            log.info(
+                f"GitHub API cache: {gh.cache_hits} hits, {gh.cache_misses} misses"
+            )
+        if gh.rate_limit_remaining is not None:
+            log.info(f"GitHub API rate limit: {gh.rate_limit_remaining} remaining")
+            github.set_output(
+                github_output=config.GITHUB_OUTPUT,
+                RATE_LIMIT_REMAINING=gh.rate_limit_remaining,
+            )
+
+
+def run_activity(
+    config: settings.Config,
+    gh: github_client.GitHub,
+    http_session: httpx.Client,
+    git: subprocess.Git,
+) -> int:
     event_name = config.GITHUB_EVENT_NAME
     repo_info = github.get_repository_info(
         github=gh, repository=config.GITHUB_REPOSITORY
@@ -108,6 +136,36 @@ def action(
         )
 
 
+def get_added_lines(
+    config: settings.Config,
+    gh: github_client.GitHub,
+    git: subprocess.Git,
+    base_ref: str,
+) -> dict[str, coverage_module.LineIntervals]:
+    if config.DIFF_SOURCE == "api" and config.GITHUB_PR_NUMBER:
+        try:
+            pr_files = github.get_pr_files(
+                github=gh,
+                repository=config.GITHUB_REPOSITORY,
+                pr_number=config.GITHUB_PR_NUMBER,
+                head_sha=git.rev_parse("HEAD").strip(),
+            )
+        except (github.TooManyPRFiles, github.PRHeadMismatch) as exc:
+            log.info(f"{exc}, computing the diff with git")
+        else:
+            return coverage_module.get_pr_added_lines(
+                pr_files=pr_files, git=git, base_ref=base_ref
+            )
+
+    # Changes to files that coverage didn't measure are irrelevant
+    pathspec = config.DIFF_PATHSPEC or coverage_module.get_measured_directories(
+        coverage_path=config.COVERAGE_PATH, merge=config.MERGE_COVERAGE_FILES
+    )
+    return coverage_module.get_added_lines(
+        git=git, base_ref=base_ref, pathspec=pathspec, cache_dir=config.CACHE_DIR
+    )
+
+
 def process_pr(
     config: settings.Config,
     gh: github_client.GitHub,
@@ -124,34 +182,48 @@ def process_pr(
         )
         return 0
 
-    _, coverage = coverage_module.get_coverage_info(
-        merge=config.MERGE_COVERAGE_FILES,
-        coverage_path=config.COVERAGE_PATH,
-    )
     base_ref = config.GITHUB_BASE_REF or repo_info.default_branch
-
-    added_lines = coverage_module.get_added_lines(git=git, base_ref=base_ref)
-    diff_coverage = coverage_module.get_diff_coverage_info(
-        coverage=coverage, added_lines=added_lines
-    )
     # It only really makes sense to display a comparison with the previous
     # coverage if the PR target is the branch in which the coverage data is
     # stored, e.g. the default branch.
     # In the case we're running on a branch without a PR yet, we can't know
     # if it's going to target the default branch, so we display it.
-    previous_coverage_data_file = None
     pr_targets_default_branch = base_ref == repo_info.default_branch
+    will_post_comment = config.GITHUB_PR_NUMBER and not config.FORCE_WORKFLOW_RUN
 
-    if pr_targets_default_branch:
-        previous_coverage_data_file = storage.get_datafile_contents(
-            github=gh,
-            repository=config.GITHUB_REPOSITORY,
-            branch=config.FINAL_COVERAGE_DATA_BRANCH,
-        )
+    added_lines = get_added_lines(config=config, gh=gh, git=git, base_ref=base_ref)
+
+    # We only need the line data of the files changed by the PR.
+    _, coverage = coverage_module.get_coverage_info(
+        merge=config.MERGE_COVERAGE_FILES,
+        coverage_path=config.COVERAGE_PATH,
+        loader=config.COVERAGE_LOADER,
+        combine_workers=config.COMBINE_WORKERS,
+        cache_dir=config.CACHE_DIR,
+        paths=added_lines,
+    )
+    diff_coverage = coverage_module.get_diff_coverage_info(
+        coverage=coverage, added_lines=added_lines
+    )
 
-    previous_coverage = None
-    if previous_coverage_data_file:
-        previous_coverage = files.parse_datafile(contents=previous_coverage_data_file)
+    # The GitHub API calls below don't depend on each other: they run
+    # concurrently. Not while the coverage is computed, because that changes
+    # the current directory of the whole process.
+    with ThreadPoolExecutor() as executor:
+        previous_coverage_future = (
+            executor.submit(get_previous_coverage, config=config, gh=gh)
+            if pr_targets_default_branch
+            else None
+        )
+        pr_number_future = executor.submit(get_pr_number, config=config, gh=gh)
+        me_future = (
+            executor.submit(github.get_my_login, github=gh)
+            if will_post_comment
+            else None
+        )
+        previous_coverage = (
+            previous_coverage_future.result() if previous_coverage_future else None
+        )
 
     marker = template.get_marker(marker_id=config.SUBPROJECT_ID)
     try:
@@ -185,21 +257,7 @@ def process_pr(
     github.add_job_summary(
         content=comment, github_step_summary=config.GITHUB_STEP_SUMMARY
     )
-    pr_number: int | None = config.GITHUB_PR_NUMBER
-    if pr_number is None:
-        # If we don't have a PR number, we're launched from a push event,
-        # so we need to find the PR number from the branch name
-        try:
-            pr_number = github.find_pr_for_branch(
-                github=gh,
-                # A push event cannot be initiated from a forked repository
-                repository=config.GITHUB_REPOSITORY,
-                owner=config.GITHUB_REPOSITORY.split("/")[0],
-                branch=config.GITHUB_BRANCH_NAME,
-            )
-        except github.CannotDeterminePR:
-            pr_number = None
-
+    pr_number = pr_number_future.result()
     if pr_number is not None and config.ANNOTATE_MISSING_LINES:
         annotations.create_pr_annotations(
             annotation_type=config.ANNOTATION_TYPE, diff_coverage=diff_coverage
@@ -211,7 +269,7 @@ def process_pr(
 
         github.post_comment(
             github=gh,
-            me=github.get_my_login(github=gh),
+            me=me_future.result() if me_future else github.get_my_login(github=gh),
             repository=config.GITHUB_REPOSITORY,
             pr_number=pr_number,
             contents=comment,
@@ -240,6 +298,36 @@ def process_pr(
     return 0
 
 
+def get_previous_coverage(
+    config: settings.Config, gh: github_client.GitHub
+) -> decimal.Decimal | None:
+    previous_coverage_data_file = storage.get_datafile_contents(
+        github=gh,
+        repository=config.GITHUB_REPOSITORY,
+        branch=config.FINAL_COVERAGE_DATA_BRANCH,
+    )
+    if not previous_coverage_data_file:
+        return None
+    return files.parse_datafile(contents=previous_coverage_data_file)
+
+
+def get_pr_number(config: settings.Config, gh: github_client.GitHub) -> int | None:
+    if config.GITHUB_PR_NUMBER is not None:
+        return config.GITHUB_PR_NUMBER
+    # If we don't have a PR number, we're launched from a push event,
+    # so we need to find the PR number from the branch name
+    try:
+        return github.find_pr_for_branch(
+            github=gh,
+            # A push event cannot be initiated from a forked repository
+            repository=config.GITHUB_REPOSITORY,
+            owner=config.GITHUB_REPOSITORY.split("/")[0],
+            branch=config.GITHUB_BRANCH_NAME,
+        )
+    except github.CannotDeterminePR:
+        return None
+
+
 def post_comment(
     config: settings.Config,
     gh: github_client.GitHub,
@@ -250,38 +338,43 @@ def post_comment(
         log.error("Missing input GITHUB_PR_RUN_ID. Please consult the documentation.")
         return 1
 
-    me = github.get_my_login(github=gh)
-    log.info(f"Search for PR associated with run id {config.GITHUB_PR_RUN_ID}")
-    owner, branch = github.get_branch_from_workflow_run(
-        github=gh,
-        run_id=config.GITHUB_PR_RUN_ID,
-        repository=config.GITHUB_REPOSITORY,
-    )
-    try:
-        pr_number = github.find_pr_for_branch(
+    # Neither depends on the PR: fetch them while we look for it
+    with ThreadPoolExecutor() as executor:
+        me_future = executor.submit(github.get_my_login, github=gh)
+        comment_future = executor.submit(
+            github.download_artifact,
             github=gh,
             repository=config.GITHUB_REPOSITORY,
-            owner=owner,
-            branch=branch,
+            artifact_name=config.COMMENT_ARTIFACT_NAME,
+            run_id=config.GITHUB_PR_RUN_ID,
+            filename=config.FINAL_COMMENT_FILENAME,
         )
-    except github.CannotDeterminePR:
-        log.error(
-            "The PR cannot be found. That's strange. Please open an "
-            "issue at https://github.com/py-cov-action/python-coverage-comment-action",
-            exc_info=True,
+
+        log.info(f"Search for PR associated with run id {config.GITHUB_PR_RUN_ID}")
+        owner, branch = github.get_branch_from_workflow_run(
+            github=gh,
+            run_id=config.GITHUB_PR_RUN_ID,
+            repository=config.GITHUB_REPOSITORY,
         )
-        return 1
+        try:
+            pr_number = github.find_pr_for_branch(
+                github=gh,
+                repository=config.GITHUB_REPOSITORY,
+                owner=owner,
+                branch=branch,
+            )
+        except github.CannotDeterminePR:
+            log.error(
+                "The PR cannot be found. That's strange. Please open an "
+                "issue at https://github.com/py-cov-action/python-coverage-comment-action",
+                exc_info=True,
+            )
+            return 1
 
     log.info(f"PR number: {pr_number}")
     log.info("Download associated artifacts")
     try:
-        comment = github.download_artifact(
-            github=gh,
-            repository=config.GITHUB_REPOSITORY,
-            artifact_name=config.COMMENT_ARTIFACT_NAME,
-            run_id=config.GITHUB_PR_RUN_ID,
-            filename=config.FINAL_COMMENT_FILENAME,
-        )
+        comment = comment_future.result()
     except github.NoArtifact:
         log.info(
             "Artifact was not found, which is probably because it was probably "
@@ -292,7 +385,7 @@ def post_comment(
     log.info("Comment file found in artifact, posting to PR")
     github.post_comment(
         github=gh,
-        me=me,
+        me=me_future.result(),
         repository=config.GITHUB_REPOSITORY,
         pr_number=pr_number,
         contents=comment,
@@ -311,9 +404,18 @@ def save_coverage_data_files(
 ) -> int:
     log.info("Computing coverage files & badge")
 
-    raw_coverage_data, coverage = coverage_module.get_coverage_info(
+    is_public = repo_info.is_public()
+    html_dir = None
+    if is_public:
+        log.info("Generating HTML coverage report")
+        html_dir = files.make_html_dir()
+
+    raw_coverage_data, coverage, markdown_report = coverage_module.get_coverage_reports(
         merge=config.MERGE_COVERAGE_FILES,
         coverage_path=config.COVERAGE_PATH,
+        loader=config.COVERAGE_LOADER,
+        combine_workers=config.COMBINE_WORKERS,
+        html_destination=html_dir,
     )
 
     operations: list[files.Operation] = files.compute_files(
@@ -325,16 +427,8 @@ def save_coverage_data_files(
         http_session=http_session,
     )
 
-    is_public = repo_info.is_public()
-    if is_public:
-        log.info("Generating HTML coverage report")
-        operations.append(
-            files.get_coverage_html_files(coverage_path=config.COVERAGE_PATH)
-        )
-
-    markdown_report = coverage_module.generate_coverage_markdown(
-        coverage_path=config.COVERAGE_PATH
-    )
+    if html_dir:
+        operations.append(files.get_coverage_html_files(html_dir=html_dir))
 
     github.add_job_summary(
         content=f"## Coverage report\n\n{markdown_report}",
@@ -18,6 +18,14 @@ class InvalidAnnotationType(Exception):
     pass
 
 
+class InvalidCoverageLoader(Exception):
+    pass
+
+
+class InvalidDiffSource(Exception):
+    pass
+
+
 def path_below(path_str: str | pathlib.Path) -> pathlib.Path:
     try:
         return pathlib.Path(path_str).resolve().relative_to(pathlib.Path.cwd())
@@ -48,6 +56,8 @@ class Config:
     GITHUB_EVENT_NAME: str
     GITHUB_PR_RUN_ID: int | None
     GITHUB_STEP_SUMMARY: pathlib.Path
+    # Set by GitHub Actions, different on GitHub Enterprise Server
+    GITHUB_API_URL: str = "https://api.github.com"
     COMMENT_TEMPLATE: str | None = None
     COVERAGE_DATA_BRANCH: str = "python-coverage-comment-action-data"
     COVERAGE_PATH: pathlib.Path = pathlib.Path(".")
@@ -58,6 +68,13 @@ class Config:
     MINIMUM_GREEN: decimal.Decimal = decimal.Decimal("100")
     MINIMUM_ORANGE: decimal.Decimal = decimal.Decimal("70")
     MERGE_COVERAGE_FILES: bool = False
+    COMBINE_WORKERS: int = 1
+    COVERAGE_LOADER: str = "subprocess"
+    CACHE_DIR: pathlib.Path | None = None
+    DIFF_PATHSPEC: list[str] | None = None
+    DIFF_SOURCE: str = "git"
+    API_RETRIES: int = 3
+    API_RETRY_BUDGET: int = 120
     ANNOTATE_MISSING_LINES: bool = False
     ANNOTATION_TYPE: str = "warning"
     VERBOSE: bool = False
@@ -85,6 +102,18 @@ class Config:
     def clean_merge_coverage_files(cls, value: str) -> bool:
         return str_to_bool(value)
 
+    @classmethod
+    def clean_combine_workers(cls, value: str) -> int:
+        return int(value) if value else 1
+
+    @classmethod
+    def clean_api_retries(cls, value: str) -> int:
+        return int(value) if value else 3
+
+    @classmethod
+    def clean_api_retry_budget(cls, value: str) -> int:
+        return int(value) if value else 120
+
     @classmethod
     def clean_annotate_missing_lines(cls, value: str) -> bool:
         return str_to_bool(value)
@@ -97,6 +126,31 @@ class Config:
             )
         return value
 
+    @classmethod
+    def clean_coverage_loader(cls, value: str) -> str:
+        if value not in {"subprocess", "in-process", "sqlite", "streaming"}:
+            raise InvalidCoverageLoader(
+                f"The coverage loader {value} is not valid. Please choose from subprocess, in-process, sqlite or streaming"
+            )
+        return value
+
+    @classmethod
+    def clean_cache_dir(cls, value: str) -> pathlib.Path | None:
+        # Absolute, as the current directory changes while we read the coverage
+        return pathlib.Path(value).resolve() if value else None
+
+    @classmethod
+    def clean_diff_pathspec(cls, value: str) -> list[str] | None:
+        return value.split() or None
+
+    @classmethod
+    def clean_diff_source(cls, value: str) -> str:
+        if value not in {"git", "api"}:
+            raise InvalidDiffSource(
+                f"The diff source {value} is not valid. Please choose from git or api"
+            )
+        return value
+
     @classmethod
     def clean_verbose(cls, value: str) -> bool:
         if str_to_bool(value):
@@ -4,6 +4,8 @@ import functools
 import os
 import pathlib
 import subprocess
+import tempfile
+from collections.abc import Iterator
 from typing import Any
 
 from coverage_comment import log
@@ -34,6 +36,36 @@ def run(*args, path: pathlib.Path, **kwargs) -> str:
         raise SubProcessError("\n".join([exc.stderr, exc.stdout])) from exc
 
 
+def stream(*args, path: pathlib.Path, **kwargs) -> Iterator[str]:
+    """
+    Like `run`, but yields the lines of stdout as the command writes them,
+    instead of buffering the whole output. The exit code is checked once stdout
+    is exhausted.
+    """
+    # stderr goes to a file rather than a pipe: nobody reads it while we
+    # consume stdout, so a pipe could fill up and block the command.
+    with (
+        tempfile.TemporaryFile(mode="w+") as stderr,
+        subprocess.Popen(
+            args,
+            cwd=path,
+            text=True,
+            stdout=subprocess.PIPE,
+            stderr=stderr,
+            **kwargs,
+        ) as process,
+    ):
+        yield from process.stdout or ()
+        returncode = process.wait()
+        if returncode:
+            stderr.seek(0)
+            error = stderr.read()
+            log.debug(
+                f"Command failed: {args=} {path=} {kwargs=} {error=} {returncode=}"
+            )
+            raise SubProcessError(error)
+
+
 class Git:
     """
     Wrapper around calling git subprocesses in a way that reads a tiny bit like
@@ -47,6 +79,10 @@ class Git:
     >>> git.clone(url)
     >>> git.commit("-m", message)
     >>> git.rev_parse("--short", "HEAD")
+
+    Use `stream` for commands with a large output, to iterate over its lines:
+
+    >>> for line in git.stream("diff", "HEAD"):
     """
 
     cwd = pathlib.Path(".")
@@ -70,5 +106,20 @@ class Git:
         except SubProcessError as exc:
             raise GitError from exc
 
+    def stream(
+        self, command: str, *args: str, env: dict[str, str] | None = None, **kwargs
+    ) -> Iterator[str]:
+        try:
+            yield from stream(
+                "git",
+                command,
+                *args,
+                path=self.cwd,
+                env=os.environ | (env or {}),
+                **kwargs,
+            )
+        except SubProcessError as exc:
+            raise GitError from exc
+
     def __getattr__(self, name: str) -> Any:
         return functools.partial(self._git, name.replace("_", "-"))
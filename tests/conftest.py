@@ -1,7 +1,7 @@
 from __future__ import annotations
 
+import dataclasses
 import datetime
-import decimal
 import functools
 import io
 import os
@@ -127,7 +127,6 @@ def coverage_obj():
         info=coverage_module.CoverageInfo(
             covered_lines=5,
             num_statements=6,
-            percent_covered=decimal.Decimal("0.75"),
             missing_lines=1,
             excluded_lines=0,
             num_branches=2,
@@ -144,7 +143,6 @@ def coverage_obj():
                 info=coverage_module.CoverageInfo(
                     covered_lines=5,
                     num_statements=6,
-                    percent_covered=decimal.Decimal("0.75"),
                     missing_lines=1,
                     excluded_lines=0,
                     num_branches=2,
@@ -169,7 +167,6 @@ def coverage_obj_no_branch():
         info=coverage_module.CoverageInfo(
             covered_lines=5,
             num_statements=6,
-            percent_covered=decimal.Decimal("0.75"),
             missing_lines=1,
             excluded_lines=0,
             num_branches=None,
@@ -186,7 +183,6 @@ def coverage_obj_no_branch():
                 info=coverage_module.CoverageInfo(
                     covered_lines=5,
                     num_statements=6,
-                    percent_covered=decimal.Decimal("0.8333"),
                     missing_lines=1,
                     excluded_lines=0,
                     num_branches=None,
@@ -211,7 +207,6 @@ def coverage_obj_more_files(coverage_obj_no_branch):
         info=coverage_module.CoverageInfo(
             covered_lines=3,
             num_statements=4,
-            percent_covered=decimal.Decimal("0.75"),
             missing_lines=1,
             excluded_lines=0,
             num_branches=None,
@@ -228,7 +223,8 @@ def make_coverage_obj(coverage_obj_more_files):
     def f(**kwargs):
         obj = coverage_obj_more_files
         for key, value in kwargs.items():
-            vars(obj.files[pathlib.Path(key)]).update(value)
+            path = pathlib.Path(key)
+            obj.files[path] = dataclasses.replace(obj.files[path], **value)
         return obj
 
     return f
@@ -239,12 +235,12 @@ def diff_coverage_obj():
     return coverage_module.DiffCoverage(
         total_num_lines=5,
         total_num_violations=1,
-        total_percent_covered=decimal.Decimal("0.8"),
         num_changed_lines=39,
         files={
             pathlib.Path("codebase/code.py"): coverage_module.FileDiffCoverage(
                 path=pathlib.Path("codebase/code.py"),
-                percent_covered=decimal.Decimal("0.8"),
+                covered_lines=4,
+                num_lines=5,
                 violation_lines=[7, 9],
             )
         },
@@ -256,17 +252,18 @@ def diff_coverage_obj_many_missing_lines():
     return coverage_module.DiffCoverage(
         total_num_lines=5,
         total_num_violations=1,
-        total_percent_covered=decimal.Decimal("0.8"),
         num_changed_lines=39,
         files={
             pathlib.Path("codebase/code.py"): coverage_module.FileDiffCoverage(
                 path=pathlib.Path("codebase/code.py"),
-                percent_covered=decimal.Decimal("0.8"),
+                covered_lines=4,
+                num_lines=5,
                 violation_lines=[7, 9],
             ),
             pathlib.Path("codebase/main.py"): coverage_module.FileDiffCoverage(
                 path=pathlib.Path("codebase/code.py"),
-                percent_covered=decimal.Decimal("0.8"),
+                covered_lines=4,
+                num_lines=5,
                 violation_lines=[1, 2, 8, 17],
             ),
         },
@@ -414,6 +411,9 @@ def git(is_failed):
                 return stdout
             raise subprocess.GitError
 
+        def stream(self, command, *args, env=None):
+            yield from self.command(command, *args, env=env).splitlines(keepends=True)
+
         def __getattr__(self, value):
             return functools.partial(self.command, value.replace("_", "-"))
 
@@ -124,6 +124,66 @@ def test_get_branch_from_workflow_run(gh, session):
     assert branch == "other"
 
 
+def test_get_pr_files(gh, session):
+    session.register("GET", "/repos/foo/bar/pulls/12")(
+        json={"changed_files": 201, "head": {"sha": "abc"}}
+    )
+    for page in [1, 2, 3]:
+        session.register(
+            "GET",
+            "/repos/foo/bar/pulls/12/files",
+            params={"per_page": 100, "page": page},
+        )(json=[{"filename": f"file_{page}.py"}])
+
+    result = github.get_pr_files(
+        github=gh, repository="foo/bar", pr_number=12, head_sha="abc"
+    )
+
+    assert [pr_file.filename for pr_file in result] == [
+        "file_1.py",
+        "file_2.py",
+        "file_3.py",
+    ]
+
+
+def test_get_pr_files__no_files(gh, session):
+    session.register("GET", "/repos/foo/bar/pulls/12")(
+        json={"changed_files": 0, "head": {"sha": "abc"}}
+    )
+    session.register(
+        "GET", "/repos/foo/bar/pulls/12/files", params={"per_page": 100, "page": 1}
+    )(json=[])
+
+    result = github.get_pr_files(
+        github=gh, repository="foo/bar", pr_number=12, head_sha="abc"
+    )
+
+    assert result == []
+
+
+def test_get_pr_files__too_many_files(gh, session):
+    session.register("GET", "/repos/foo/bar/pulls/12")(
+        json={"changed_files": 3001, "head": {"sha": "abc"}}
+    )
+
+    with pytest.raises(github.TooManyPRFiles):
+        github.get_pr_files(
+            github=gh, repository="foo/bar", pr_number=12, head_sha="abc"
+        )
+
+
+def test_get_pr_files__head_mismatch(gh, session):
+    # e.g. the merge commit of the PR is checked out, not its head
+    session.register("GET", "/repos/foo/bar/pulls/12")(
+        json={"changed_files": 1, "head": {"sha": "abc"}}
+    )
+
+    with pytest.raises(github.PRHeadMismatch):
+        github.get_pr_files(
+            github=gh, repository="foo/bar", pr_number=12, head_sha="def"
+        )
+
+
 def test_find_pr_for_branch(gh, session):
     params = {
         "head": "someone:other",
@@ -275,6 +335,36 @@ def test_post_comment__update(gh, session, get_logs):
     assert get_logs("INFO", "Update previous comment")
 
 
+def test_post_comment__update_next_page(gh, session, get_logs):
+    comment = {
+        "user": {"login": "foo"},
+        "body": "Hey! Hi! How are you? marker",
+        "id": 456,
+    }
+    path = "/repos/foo/bar/issues/123/comments"
+    session.register("GET", path, params={"per_page": 100, "page": 1})(
+        json=[{"user": {"login": "bar"}, "body": "Hello", "id": 123}] * 100,
+        headers={
+            "link": f'<https://api.github.com{path}?per_page=100&page=2>; rel="last"'
+        },
+    )
+    session.register("GET", path, params={"per_page": 100, "page": 2})(json=[comment])
+    session.register(
+        "PATCH", "/repos/foo/bar/issues/comments/456", json={"body": "hi!"}
+    )()
+
+    github.post_comment(
+        github=gh,
+        me="foo",
+        repository="foo/bar",
+        pr_number=123,
+        contents="hi!",
+        marker="marker",
+    )
+
+    assert get_logs("INFO", "Update previous comment")
+
+
 def test_post_comment__update_error(gh, session):
     comment = {
         "user": {"login": "foo"},
@@ -69,6 +69,15 @@ index 6c08c94..b65c612 100644
 """
 
 
+def register_diff(git, base_ref="main"):
+    git.register("git rev-parse --is-shallow-repository HEAD")(stdout="false\nabc\n")
+    git.register("git count-objects -v")()
+    git.register(f"git fetch --filter=blob:none --depth=50 origin {base_ref}")()
+    git.register("git merge-base FETCH_HEAD HEAD")(stdout="def\n")
+    git.register("git count-objects -v")()
+    git.register("git diff --unified=0 def -- .")(stdout=DIFF_STDOUT)
+
+
 @pytest.fixture
 def commit(integration_dir):
     def _():
@@ -135,6 +144,45 @@ def test_action__invalid_event_name(session, push_config, in_integration_env, ge
     assert get_logs("ERROR", "This action has only been designed to work for")
 
 
+def test_action__cache_stats(
+    session, push_config, in_integration_env, get_logs, tmp_path
+):
+    session.register("GET", "/repos/py-cov-action/foobar")(
+        json={"default_branch": "main", "visibility": "public"},
+        headers={"etag": '"abc"'},
+    )
+
+    main.action(
+        config=push_config(GITHUB_EVENT_NAME="pull_request_target", CACHE_DIR=tmp_path),
+        github_session=session,
+        http_session=session,
+        git=None,
+    )
+
+    assert get_logs("INFO", "GitHub API cache: 0 hits, 1 misses")
+
+
+def test_action__rate_limit_output(
+    session, push_config, in_integration_env, output_file, get_logs
+):
+    session.register("GET", "/repos/py-cov-action/foobar")(
+        json={"default_branch": "main", "visibility": "public"},
+        headers={"x-ratelimit-remaining": "4321"},
+    )
+
+    main.action(
+        config=push_config(
+            GITHUB_EVENT_NAME="pull_request_target", GITHUB_OUTPUT=output_file
+        ),
+        github_session=session,
+        http_session=session,
+        git=None,
+    )
+
+    assert output_file.read_text() == "RATE_LIMIT_REMAINING=4321\n"
+    assert get_logs("INFO", "GitHub API rate limit: 4321 remaining")
+
+
 def test_action__pull_request__store_comment(
     pull_request_config,
     session,
@@ -172,8 +220,7 @@ def test_action__pull_request__store_comment(
         "POST", "/repos/py-cov-action/foobar/issues/2/comments", json=checker
     )(status_code=403)
 
-    git.register("git fetch origin main --depth=1000")()
-    git.register("git diff --unified=0 FETCH_HEAD -- .")(stdout=DIFF_STDOUT)
+    register_diff(git)
 
     result = main.action(
         config=pull_request_config(
@@ -248,8 +295,7 @@ def test_action__pull_request__store_comment_not_targeting_default(
         "POST", "/repos/py-cov-action/foobar/issues/2/comments", json=checker
     )(status_code=403)
 
-    git.register("git fetch origin foo --depth=1000")(stdout=DIFF_STDOUT)
-    git.register("git diff --unified=0 FETCH_HEAD -- .")(stdout=DIFF_STDOUT)
+    register_diff(git, base_ref="foo")
 
     result = main.action(
         config=pull_request_config(
@@ -292,8 +338,7 @@ def test_action__pull_request__post_comment(
     # Are there already comments
     session.register("GET", "/repos/py-cov-action/foobar/issues/2/comments")(json=[])
 
-    git.register("git fetch origin main --depth=1000")()
-    git.register("git diff --unified=0 FETCH_HEAD -- .")(stdout=DIFF_STDOUT)
+    register_diff(git)
 
     comment = None
 
@@ -338,8 +383,7 @@ def test_action__push__non_default_branch(
     session.register("GET", "/repos/py-cov-action/foobar")(
         json={"default_branch": "main", "visibility": "public"}
     )
-    git.register("git fetch origin main --depth=1000")(stdout=DIFF_STDOUT)
-    git.register("git diff --unified=0 FETCH_HEAD -- .")(stdout=DIFF_STDOUT)
+    register_diff(git)
 
     payload = json.dumps({"coverage": 30.00})
     # There is an existing badge in this test, allowing to test the coverage evolution
@@ -427,8 +471,7 @@ def test_action__push__non_default_branch__no_pr(
     session.register("GET", "/repos/py-cov-action/foobar")(
         json={"default_branch": "main", "visibility": "public"}
     )
-    git.register("git fetch origin main --depth=1000")(stdout=DIFF_STDOUT)
-    git.register("git diff --unified=0 FETCH_HEAD -- .")(stdout=DIFF_STDOUT)
+    register_diff(git)
 
     payload = json.dumps({"coverage": 30.00})
     # There is an existing badge in this test, allowing to test the coverage evolution
@@ -491,8 +534,7 @@ def test_action__pull_request__force_store_comment(
         "/repos/py-cov-action/foobar/contents/data.json",
     )(json={"content": base64.b64encode(payload.encode()).decode()})
 
-    git.register("git fetch origin main --depth=1000")()
-    git.register("git diff --unified=0 FETCH_HEAD -- .")(stdout=DIFF_STDOUT)
+    register_diff(git)
 
     result = main.action(
         config=pull_request_config(FORCE_WORKFLOW_RUN=True, GITHUB_OUTPUT=output_file),
@@ -522,8 +564,10 @@ def test_action__pull_request__post_comment__no_marker(
         "/repos/py-cov-action/foobar/contents/data.json",
     )(status_code=404)
 
-    git.register("git fetch origin main --depth=1000")()
-    git.register("git diff --unified=0 FETCH_HEAD -- .")(stdout=DIFF_STDOUT)
+    register_diff(git)
+
+    # Who am I (asked while the comment is generated)
+    session.register("GET", "/user")(json={"login": "foo"})
 
     result = main.action(
         config=pull_request_config(COMMENT_TEMPLATE="""foo"""),
@@ -547,8 +591,7 @@ def test_action__pull_request__annotations(
         "/repos/py-cov-action/foobar/contents/data.json",
     )(status_code=404)
 
-    git.register("git fetch origin main --depth=1000")()
-    git.register("git diff --unified=0 FETCH_HEAD -- .")(stdout=DIFF_STDOUT)
+    register_diff(git)
 
     # Who am I
     session.register("GET", "/user")(json={"login": "foo"})
@@ -589,8 +632,10 @@ def test_action__pull_request__post_comment__template_error(
         "/repos/py-cov-action/foobar/contents/data.json",
     )(status_code=404)
 
-    git.register("git fetch origin main --depth=1000")()
-    git.register("git diff --unified=0 FETCH_HEAD -- .")(stdout=DIFF_STDOUT)
+    register_diff(git)
+
+    # Who am I (asked while the comment is generated)
+    session.register("GET", "/user")(json={"login": "foo"})
 
     result = main.action(
         config=pull_request_config(COMMENT_TEMPLATE="""{%"""),
@@ -602,8 +647,9 @@ def test_action__pull_request__post_comment__template_error(
     assert get_logs("ERROR", "There was a rendering error")
 
 
+@pytest.mark.parametrize("loader", ["subprocess", "in-process"])
 def test_action__push__default_branch(
-    push_config, session, in_integration_env, get_logs, git, summary_file
+    push_config, session, in_integration_env, get_logs, git, summary_file, loader
 ):
     session.register("GET", "/repos/py-cov-action/foobar")(
         json={"default_branch": "main", "visibility": "public"}
@@ -628,7 +674,7 @@ def test_action__push__default_branch(
     git.register("git switch foo")()
 
     result = main.action(
-        config=push_config(GITHUB_STEP_SUMMARY=summary_file),
+        config=push_config(GITHUB_STEP_SUMMARY=summary_file, COVERAGE_LOADER=loader),
         github_session=session,
         http_session=session,
         git=git,
@@ -764,6 +810,12 @@ def test_action__workflow_run__no_pr(
         },
     )(json=[])
 
+    # The artifact is downloaded while the PR is searched for
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/actions/runs/123/artifacts",
+    )(json={"artifacts": [{"name": "wrong_name"}]})
+
     result = main.action(
         config=workflow_run_config(),
         github_session=session,
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import gzip
+
+import pytest
+
+from coverage_comment import cache
+
+
+def test_file_digest(tmp_path):
+    path = tmp_path / "foo"
+    path.write_text("foo")
+
+    assert cache.file_digest(path) == (
+        "2c26b46b68ffc68ff99b453c1d30413413422d706483bfa0f98a5e886266e7ae"
+    )
+
+
+def test_get_key():
+    assert cache.get_key("a", "b") == cache.get_key("a", "b")
+    assert cache.get_key("ab", "c") != cache.get_key("a", "bc")
+
+
+def test_get_key__version(mocker):
+    key = cache.get_key("a")
+    mocker.patch("coverage_comment.cache.CACHE_VERSION", "0")
+
+    assert cache.get_key("a") != key
+
+
+def test_read_write_json(tmp_path):
+    cache.write_json(cache_dir=tmp_path, namespace="ns", key="abc", value={"a": [1]})
+
+    assert (tmp_path / "ns" / "abc.json.gz").exists()
+    assert cache.read_json(cache_dir=tmp_path, namespace="ns", key="abc") == {"a": [1]}
+
+
+def test_read_json__miss(tmp_path, get_logs):
+    assert cache.read_json(cache_dir=tmp_path, namespace="ns", key="abc") is None
+    assert get_logs("DEBUG", "Cache miss: ns/abc")
+
+
+@pytest.mark.parametrize("content", [b"not gzip", gzip.compress(b"not json")])
+def test_read_json__corrupted(tmp_path, get_logs, content):
+    (tmp_path / "ns").mkdir()
+    (tmp_path / "ns" / "abc.json.gz").write_bytes(content)
+
+    assert cache.read_json(cache_dir=tmp_path, namespace="ns", key="abc") is None
+    assert get_logs("WARNING", "Ignoring corrupted cache entry")
+
+
+def test_read_write_file(tmp_path):
+    source = tmp_path / "source"
+    source.write_bytes(b"foo")
+    destination = tmp_path / "destination"
+
+    cache.write_file(cache_dir=tmp_path, namespace="ns", key="abc", source=source)
+
+    assert cache.read_file(
+        cache_dir=tmp_path, namespace="ns", key="abc", destination=destination
+    )
+    assert destination.read_bytes() == b"foo"
+
+
+def test_read_file__miss(tmp_path):
+    destination = tmp_path / "destination"
+
+    assert not cache.read_file(
+        cache_dir=tmp_path, namespace="ns", key="abc", destination=destination
+    )
+    assert not destination.exists()
+
+
+def test_atomic_path(tmp_path):
+    path = tmp_path / "a" / "b"
+    with cache.atomic_path(path) as tmp:
+        tmp.write_text("foo")
+        assert not path.exists()
+
+    assert path.read_text() == "foo"
+    assert list(path.parent.iterdir()) == [path]
+
+
+def test_atomic_path__error(tmp_path):
+    path = tmp_path / "b"
+    with pytest.raises(ZeroDivisionError):
+        with cache.atomic_path(path) as tmp:
+            tmp.write_text("foo")
+            1 / 0
+
+    assert list(tmp_path.iterdir()) == []
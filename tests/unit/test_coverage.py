@@ -1,12 +1,21 @@
 from __future__ import annotations
 
+import contextlib
+import dataclasses
 import decimal
+import io
 import json
 import pathlib
+import shutil
+import sqlite3
+import threading
 
+import coverage as coveragepy
 import pytest
+from coverage import numbits as numbits_module
+from coverage.results import Numbers
 
-from coverage_comment import coverage, subprocess
+from coverage_comment import cache, coverage, subprocess
 
 
 @pytest.mark.parametrize(
@@ -79,6 +88,771 @@ def test_get_coverage_info__error_no_source(mocker, get_logs):
     assert get_logs("ERROR", "Cannot read")
 
 
+def test_get_coverage_info__in_process(mocker, coverage_json, coverage_obj):
+    run = mocker.patch("coverage_comment.subprocess.run")
+    generate = mocker.patch(
+        "coverage_comment.coverage.generate_coverage_json", return_value=coverage_json
+    )
+
+    raw_coverage_information, result = coverage.get_coverage_info(
+        merge=False, coverage_path=pathlib.Path("."), loader="in-process"
+    )
+
+    generate.assert_called_once_with(coverage_path=pathlib.Path("."), only_files=None)
+    assert run.call_args_list == []
+    assert result == coverage_obj
+    assert raw_coverage_information == coverage_json
+
+
+def test_get_coverage_info__in_process_fallback(
+    mocker, coverage_json, coverage_obj, get_logs
+):
+    run = mocker.patch(
+        "coverage_comment.subprocess.run", return_value=json.dumps(coverage_json)
+    )
+    mocker.patch(
+        "coverage_comment.coverage.generate_coverage_json",
+        side_effect=coveragepy.CoverageException("bla"),
+    )
+
+    _, result = coverage.get_coverage_info(
+        merge=False, coverage_path=pathlib.Path("."), loader="in-process"
+    )
+
+    assert run.call_args_list == [
+        mocker.call("coverage", "json", "-o", "-", path=pathlib.Path(".")),
+    ]
+    assert result == coverage_obj
+    assert get_logs("INFO", "falling back to `coverage json`")
+
+
+def test_get_coverage_info__streaming(mocker, coverage_json, coverage_obj):
+    def run(*args, path):
+        assert args[:3] == ("coverage", "json", "-o")
+        pathlib.Path(args[3]).write_text(json.dumps(coverage_json))
+
+    mocker.patch("coverage_comment.subprocess.run", side_effect=run)
+
+    raw_coverage_information, result = coverage.get_coverage_info(
+        merge=False, coverage_path=pathlib.Path("."), loader="streaming"
+    )
+
+    assert result == coverage_obj
+    assert raw_coverage_information == coverage_json
+    file_data = raw_coverage_information["files"]["codebase/code.py"]
+    assert isinstance(file_data["executed_lines"], coverage.LineNumbers)
+
+
+def test_read_coverage_json(coverage_json):
+    result = coverage.read_coverage_json(
+        file=io.StringIO(json.dumps(coverage_json)), only_files=None
+    )
+
+    assert result == coverage_json
+
+
+def test_read_coverage_json__only_files(coverage_json):
+    result = coverage.read_coverage_json(
+        file=io.StringIO(json.dumps(coverage_json)), only_files={"other.py"}
+    )
+
+    assert result["files"] == {}
+    assert result["totals"] == coverage_json["totals"]
+
+
+@pytest.fixture
+def coverage_json_with_regions(coverage_json):
+    file_data = coverage_json["files"]["codebase/code.py"]
+    file_data["functions"] = {"foo": {"executed_lines": [2], "summary": {}}}
+    file_data["classes"] = {"": {"executed_lines": [1], "summary": {}}}
+    file_data["executed_branches"] = [[1, 2]]
+    file_data["missing_branches"] = [[1, -1]]
+    return coverage_json
+
+
+def test_run_coverage_json__file_fields(mocker, coverage_json_with_regions):
+    mocker.patch(
+        "coverage_comment.subprocess.run",
+        return_value=json.dumps(coverage_json_with_regions),
+    )
+
+    result = coverage.run_coverage_json(coverage_path=pathlib.Path("."))
+
+    assert list(result["files"]["codebase/code.py"]) == list(coverage.FILE_FIELDS)
+
+
+def test_read_coverage_json__file_fields(coverage_json_with_regions):
+    result = coverage.read_coverage_json(
+        file=io.StringIO(json.dumps(coverage_json_with_regions)), only_files=None
+    )
+
+    assert list(result["files"]["codebase/code.py"]) == list(coverage.FILE_FIELDS)
+
+
+def test_stream_coverage_json__same_as_subprocess(coverage_data_dir):
+    streamed = coverage.stream_coverage_json(coverage_path=coverage_data_dir)
+    parsed = coverage.run_coverage_json(coverage_path=coverage_data_dir)
+
+    assert streamed["files"] == parsed["files"]
+    assert streamed["totals"] == parsed["totals"]
+
+
+@pytest.fixture
+def coverage_data_dir(tmp_path):
+    """
+    A directory with a small source file and the corresponding .coverage file
+    """
+    (tmp_path / "code.py").write_text(
+        "a = 1\nif a:\n    b = 2\nelse:\n    b = 3\nc = 4  # pragma: no cover\n"
+    )
+    data = coveragepy.CoverageData(basename=str(tmp_path / ".coverage"))
+    data.add_arcs({str(tmp_path / "code.py"): {(-1, 1), (1, 2), (2, 3), (3, -1)}})
+    data.write()
+    return tmp_path
+
+
+def test_generate_coverage_json(coverage_data_dir):
+    result = coverage.generate_coverage_json(coverage_path=coverage_data_dir)
+
+    assert result["meta"]["branch_coverage"] is True
+    assert result["files"] == {
+        "code.py": {
+            "executed_lines": [1, 2, 3],
+            "summary": {
+                "covered_lines": 3,
+                "num_statements": 4,
+                "percent_covered": 66.66666666666667,
+                "percent_covered_display": "67",
+                "missing_lines": 1,
+                "excluded_lines": 1,
+                "num_branches": 2,
+                "num_partial_branches": 1,
+                "covered_branches": 1,
+                "missing_branches": 1,
+            },
+            "missing_lines": [5],
+            "excluded_lines": [6],
+            "missing_branches": [[2, 5]],
+        }
+    }
+    assert result["totals"] == result["files"]["code.py"]["summary"]
+
+
+def test_generate_coverage_json__same_as_subprocess(coverage_data_dir):
+    in_process = coverage.extract_info(
+        data=coverage.generate_coverage_json(coverage_path=coverage_data_dir),
+        coverage_path=coverage_data_dir,
+    )
+    _, from_subprocess = coverage.get_coverage_info(
+        merge=False, coverage_path=coverage_data_dir
+    )
+
+    assert in_process.files == from_subprocess.files
+    assert in_process.info == from_subprocess.info
+
+
+@pytest.fixture
+def line_coverage_data_dir(tmp_path):
+    """
+    Same as coverage_data_dir but without branch coverage, measured in 2
+    different contexts
+    """
+    (tmp_path / "code.py").write_text(
+        "a = 1\nif a:\n    b = 2\nelse:\n    b = 3\nc = 4  # pragma: no cover\n"
+    )
+    data = coveragepy.CoverageData(basename=str(tmp_path / ".coverage"))
+    data.set_context("test_a")
+    data.add_lines({str(tmp_path / "code.py"): {1, 2}})
+    data.set_context("test_b")
+    data.add_lines({str(tmp_path / "code.py"): {1, 3}})
+    data.write()
+    return tmp_path
+
+
+def test_get_coverage_info__sqlite(mocker, coverage_json, coverage_obj):
+    run = mocker.patch("coverage_comment.subprocess.run")
+    read = mocker.patch(
+        "coverage_comment.coverage.read_coverage_database", return_value=coverage_json
+    )
+
+    _, result = coverage.get_coverage_info(
+        merge=False, coverage_path=pathlib.Path("."), loader="sqlite"
+    )
+
+    read.assert_called_once_with(coverage_path=pathlib.Path("."), only_files=None)
+    assert run.call_args_list == []
+    assert result == coverage_obj
+
+
+def test_get_coverage_info__sqlite_fallback(
+    mocker, coverage_json, coverage_obj, get_logs
+):
+    mocker.patch(
+        "coverage_comment.subprocess.run", return_value=json.dumps(coverage_json)
+    )
+    mocker.patch(
+        "coverage_comment.coverage.read_coverage_database",
+        side_effect=coverage.UnsupportedCoverageData("Branch coverage data"),
+    )
+
+    _, result = coverage.get_coverage_info(
+        merge=False, coverage_path=pathlib.Path("."), loader="sqlite"
+    )
+
+    assert result == coverage_obj
+    assert get_logs("INFO", "(Branch coverage data), falling back")
+
+
+def test_read_coverage_database(line_coverage_data_dir):
+    result = coverage.read_coverage_database(coverage_path=line_coverage_data_dir)
+
+    assert result["meta"]["branch_coverage"] is False
+    assert result["files"] == {
+        "code.py": {
+            "executed_lines": [1, 2, 3],
+            "summary": {
+                "covered_lines": 3,
+                "num_statements": 4,
+                "percent_covered": 75.0,
+                "percent_covered_display": "75",
+                "missing_lines": 1,
+                "excluded_lines": 1,
+            },
+            "missing_lines": [5],
+            "excluded_lines": [6],
+        }
+    }
+    assert result["totals"] == result["files"]["code.py"]["summary"]
+
+
+def test_read_coverage_database__same_as_in_process(line_coverage_data_dir):
+    # Measured, but never executed
+    (line_coverage_data_dir / "other.py").write_text("a = 1\nb = 2\n")
+    data = coveragepy.CoverageData(basename=str(line_coverage_data_dir / ".coverage"))
+    data.read()
+    data.touch_files([str(line_coverage_data_dir / "other.py")])
+    data.write()
+
+    result = coverage.read_coverage_database(coverage_path=line_coverage_data_dir)
+    expected = coverage.generate_coverage_json(coverage_path=line_coverage_data_dir)
+
+    assert result["files"] == expected["files"]
+    assert result["totals"] == expected["totals"]
+
+
+def test_read_coverage_database__report_filtering(line_coverage_data_dir):
+    (line_coverage_data_dir / ".coveragerc").write_text("[report]\nomit = foo.py\n")
+
+    with pytest.raises(coverage.UnsupportedCoverageData):
+        coverage.read_coverage_database(coverage_path=line_coverage_data_dir)
+
+
+def test_read_executed_lines(line_coverage_data_dir):
+    assert coverage.read_executed_lines(
+        data_file=line_coverage_data_dir / ".coverage"
+    ) == {str(line_coverage_data_dir / "code.py"): {1, 2, 3}}
+
+
+def test_read_executed_lines__no_file(tmp_path):
+    with pytest.raises(coverage.UnsupportedCoverageData):
+        coverage.read_executed_lines(data_file=tmp_path / ".coverage")
+
+
+def test_read_executed_lines__not_a_database(tmp_path):
+    (tmp_path / ".coverage").write_text("foo")
+
+    with pytest.raises(coverage.UnsupportedCoverageData):
+        coverage.read_executed_lines(data_file=tmp_path / ".coverage")
+
+
+def test_read_executed_lines__arcs(coverage_data_dir):
+    with pytest.raises(coverage.UnsupportedCoverageData, match="Branch"):
+        coverage.read_executed_lines(data_file=coverage_data_dir / ".coverage")
+
+
+def test_read_executed_lines__plugin(tmp_path):
+    data = coveragepy.CoverageData(basename=str(tmp_path / ".coverage"))
+    data.add_lines({"template.html": {1}})
+    data.add_file_tracers({"template.html": "plugin.Tracer"})
+    data.write()
+
+    with pytest.raises(coverage.UnsupportedCoverageData, match="plugins"):
+        coverage.read_executed_lines(data_file=tmp_path / ".coverage")
+
+
+def test_read_executed_lines__schema_version(line_coverage_data_dir):
+    with sqlite3.connect(line_coverage_data_dir / ".coverage") as db:
+        db.execute("UPDATE coverage_schema SET version = 8")
+
+    with pytest.raises(coverage.UnsupportedCoverageData, match="schema"):
+        coverage.read_executed_lines(data_file=line_coverage_data_dir / ".coverage")
+
+
+@pytest.mark.parametrize(
+    "numbits, expected",
+    [
+        (0, []),
+        (0b100110, [1, 2, 5]),
+        (1 << 1000 | 1 << 8, [8, 1000]),
+    ],
+)
+def test_decode_numbits(numbits, expected):
+    assert coverage.decode_numbits(numbits) == expected
+
+
+@pytest.mark.parametrize(
+    "lines, expected",
+    [
+        ([], 0),
+        ([1, 2, 5], 0b100110),
+        ([8], 0b100000000),
+    ],
+)
+def test_encode_numbits(lines, expected):
+    assert coverage.encode_numbits(lines) == expected
+
+
+@pytest.mark.parametrize(
+    "intervals, expected",
+    [
+        ([], 0),
+        ([(1, 3), (5, 6)], 0b100110),
+        ([(8, 9)], 0b100000000),
+    ],
+)
+def test_encode_numbits_intervals(intervals, expected):
+    assert coverage.encode_numbits_intervals(intervals) == expected
+
+
+def test_decode_numbits__same_as_coverage():
+    nums = list(range(3, 5000, 7))
+    numbits = int.from_bytes(numbits_module.nums_to_numbits(nums), "little")
+
+    assert coverage.decode_numbits(numbits) == nums
+
+
+def test_get_coverage_reports__subprocess(mocker, coverage_json, coverage_obj):
+    run = mocker.patch(
+        "coverage_comment.subprocess.run", return_value=json.dumps(coverage_json)
+    )
+
+    raw, result, markdown = coverage.get_coverage_reports(
+        merge=True,
+        coverage_path=pathlib.Path("."),
+        loader="subprocess",
+        html_destination=pathlib.Path("/tmp/foo"),
+    )
+
+    assert [c.args[:2] for c in run.call_args_list] == [
+        ("coverage", "combine"),
+        ("coverage", "json"),
+        ("coverage", "html"),
+        ("coverage", "report"),
+    ]
+    assert raw == coverage_json
+    assert result == coverage_obj
+    assert markdown == json.dumps(coverage_json)
+
+
+def test_get_coverage_reports__in_process(mocker, coverage_data_dir, tmp_path_factory):
+    run = mocker.patch("coverage_comment.subprocess.run")
+    html_dir = tmp_path_factory.mktemp("html")
+
+    raw, result, markdown = coverage.get_coverage_reports(
+        merge=True,
+        coverage_path=coverage_data_dir,
+        loader="in-process",
+        html_destination=html_dir,
+    )
+
+    assert run.call_args_list == [
+        mocker.call("coverage", "combine", path=coverage_data_dir),
+    ]
+    assert list(raw["files"]) == ["code.py"]
+    assert result.files[coverage_data_dir / "code.py"].missing_lines == [5]
+    assert "| code.py   |" in markdown
+    assert (html_dir / "index.html").exists()
+
+
+def test_get_coverage_reports__in_process_no_html(coverage_data_dir):
+    _, _, markdown = coverage.get_coverage_reports(
+        merge=False,
+        coverage_path=coverage_data_dir,
+        loader="in-process",
+        html_destination=None,
+    )
+
+    assert "| code.py   |" in markdown
+    assert not (coverage_data_dir / "htmlcov").exists()
+
+
+def test_get_coverage_reports__fallback(mocker, coverage_json, get_logs):
+    run = mocker.patch(
+        "coverage_comment.subprocess.run", return_value=json.dumps(coverage_json)
+    )
+    mocker.patch(
+        "coverage_comment.coverage.generate_coverage_reports",
+        side_effect=coveragepy.CoverageException("bla"),
+    )
+
+    coverage.get_coverage_reports(
+        merge=True,
+        coverage_path=pathlib.Path("."),
+        loader="in-process",
+        html_destination=None,
+    )
+
+    # Combine happens only once
+    assert [c.args[:2] for c in run.call_args_list] == [
+        ("coverage", "combine"),
+        ("coverage", "json"),
+        ("coverage", "report"),
+    ]
+    assert get_logs("INFO", "falling back to `coverage` commands")
+
+
+def test_loaded_coverage__analyzes_once(mocker, coverage_data_dir, tmp_path_factory):
+    analyze = mocker.spy(coveragepy.Coverage, "_analyze")
+
+    with coverage.loaded_coverage(coverage_path=coverage_data_dir) as cov:
+        coverage.get_coverage_json(cov=cov)
+        cov.report(file=io.StringIO(), output_format="markdown")
+        cov.html_report(directory=str(tmp_path_factory.mktemp("html")))
+
+    assert analyze.call_count == 1
+
+
+@pytest.fixture
+def coverage_shards(tmp_path):
+    """
+    5 coverage data files (as produced with `coverage run --parallel`) on 2
+    source files
+    """
+    for name in ["a.py", "b.py"]:
+        (tmp_path / name).write_text("".join(f"x = {i}\n" for i in range(10)))
+    for i in range(5):
+        data = coveragepy.CoverageData(
+            basename=str(tmp_path / ".coverage"), suffix=f"shard{i}"
+        )
+        data.add_lines(
+            {str(tmp_path / "a.py"): {i + 1}, str(tmp_path / "b.py"): {2 * i + 1}}
+        )
+        data.write()
+    return tmp_path
+
+
+def read_lines(path: pathlib.Path) -> dict[str, set[int]]:
+    data = coveragepy.CoverageData(basename=str(path / ".coverage"))
+    data.read()
+    return {file: set(data.lines(file)) for file in data.measured_files()}
+
+
+def test_combine_coverage_files__serial(mocker):
+    run = mocker.patch("coverage_comment.subprocess.run")
+
+    coverage.combine_coverage_files(coverage_path=pathlib.Path("."), workers=1)
+
+    assert run.call_args_list == [
+        mocker.call("coverage", "combine", path=pathlib.Path(".")),
+    ]
+
+
+def test_combine_coverage_files__parallel(coverage_shards, get_logs):
+    coverage.combine_coverage_files(coverage_path=coverage_shards, workers=2)
+
+    assert read_lines(coverage_shards) == {
+        str(coverage_shards / "a.py"): {1, 2, 3, 4, 5},
+        str(coverage_shards / "b.py"): {1, 3, 5, 7, 9},
+    }
+    # Shards are removed, as with `coverage combine`
+    assert [p.name for p in coverage_shards.glob(".coverage*")] == [".coverage"]
+    assert get_logs("INFO", "Combining 5 coverage files with 2 workers")
+
+
+def test_combine_coverage_files__threads_running(coverage_shards):
+    # Like in process_pr, where API calls run while the coverage is combined
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait)
+    thread.start()
+    try:
+        coverage.combine_coverage_files(coverage_path=coverage_shards, workers=2)
+    finally:
+        stop.set()
+        thread.join()
+
+    assert read_lines(coverage_shards) == {
+        str(coverage_shards / "a.py"): {1, 2, 3, 4, 5},
+        str(coverage_shards / "b.py"): {1, 3, 5, 7, 9},
+    }
+
+
+def test_combine_coverage_files__same_as_serial(coverage_shards, tmp_path_factory):
+    serial_dir = tmp_path_factory.mktemp("serial")
+    shutil.copytree(coverage_shards, serial_dir, dirs_exist_ok=True)
+
+    coverage.combine_coverage_files(coverage_path=coverage_shards, workers=3)
+    coverage.combine_coverage_files(coverage_path=serial_dir, workers=1)
+
+    assert {
+        pathlib.Path(k).name: v for k, v in read_lines(coverage_shards).items()
+    } == {pathlib.Path(k).name: v for k, v in read_lines(serial_dir).items()}
+
+
+def test_combine_data_files(coverage_shards, tmp_path_factory):
+    destination = tmp_path_factory.mktemp("dest") / "combined"
+    shards = sorted(str(p) for p in coverage_shards.glob(".coverage.*"))
+
+    with contextlib.chdir(coverage_shards):
+        result = coverage.combine_data_files(
+            data_files=shards[:2], destination=str(destination)
+        )
+
+    assert result == str(destination)
+    data = coveragepy.CoverageData(basename=result)
+    data.read()
+    assert set(data.lines(str(coverage_shards / "a.py"))) == {1, 2}
+
+
+def test_combine_data_files__single():
+    assert coverage.combine_data_files(data_files=["foo"], destination="bar") == "foo"
+
+
+def test_get_coverage_cache_key(line_coverage_data_dir):
+    key = coverage.get_coverage_cache_key(
+        coverage_path=line_coverage_data_dir, merge=False
+    )
+
+    assert key == coverage.get_coverage_cache_key(
+        coverage_path=line_coverage_data_dir, merge=False
+    )
+    assert key != coverage.get_coverage_cache_key(
+        coverage_path=line_coverage_data_dir, merge=True
+    )
+
+
+def test_get_coverage_cache_key__source_changed(line_coverage_data_dir):
+    key = coverage.get_coverage_cache_key(
+        coverage_path=line_coverage_data_dir, merge=False
+    )
+    (line_coverage_data_dir / "code.py").write_text("a = 1\n")
+
+    assert key != coverage.get_coverage_cache_key(
+        coverage_path=line_coverage_data_dir, merge=False
+    )
+
+
+def test_get_coverage_cache_key__config_changed(line_coverage_data_dir):
+    (line_coverage_data_dir / ".coveragerc").write_text("[run]\n")
+    key = coverage.get_coverage_cache_key(
+        coverage_path=line_coverage_data_dir, merge=False
+    )
+    (line_coverage_data_dir / ".coveragerc").write_text("[run]\nbranch = true\n")
+
+    assert key != coverage.get_coverage_cache_key(
+        coverage_path=line_coverage_data_dir, merge=False
+    )
+
+
+def test_get_coverage_cache_key__shards(coverage_shards):
+    key = coverage.get_coverage_cache_key(coverage_path=coverage_shards, merge=True)
+    next(coverage_shards.glob(".coverage.shard*")).unlink()
+
+    assert key is not None
+    assert key != coverage.get_coverage_cache_key(
+        coverage_path=coverage_shards, merge=True
+    )
+
+
+def test_get_coverage_cache_key__no_data_file(tmp_path):
+    assert coverage.get_coverage_cache_key(coverage_path=tmp_path, merge=False) is None
+    assert coverage.get_coverage_cache_key(coverage_path=tmp_path, merge=True) is None
+
+
+def test_get_coverage_cache_key__missing_source(line_coverage_data_dir):
+    (line_coverage_data_dir / "code.py").unlink()
+
+    assert (
+        coverage.get_coverage_cache_key(
+            coverage_path=line_coverage_data_dir, merge=False
+        )
+        is None
+    )
+
+
+def test_get_coverage_info__cache(
+    mocker, line_coverage_data_dir, tmp_path_factory, get_logs
+):
+    cache_dir = tmp_path_factory.mktemp("cache")
+    expected = coverage.get_coverage_info(
+        merge=False,
+        coverage_path=line_coverage_data_dir,
+        loader="sqlite",
+        cache_dir=cache_dir,
+    )
+    assert not get_logs("INFO", "Using cached coverage data")
+
+    load = mocker.patch("coverage_comment.coverage.load_coverage_json")
+    result = coverage.get_coverage_info(
+        merge=False,
+        coverage_path=line_coverage_data_dir,
+        loader="sqlite",
+        cache_dir=cache_dir,
+    )
+
+    assert result == expected
+    assert load.call_args_list == []
+    assert get_logs("INFO", "Using cached coverage data")
+
+
+def test_get_coverage_info__cache_no_key(mocker, coverage_json, tmp_path):
+    mocker.patch(
+        "coverage_comment.coverage.load_coverage_json", return_value=coverage_json
+    )
+
+    coverage.get_coverage_info(
+        merge=False, coverage_path=tmp_path, cache_dir=tmp_path / "cache"
+    )
+
+    assert not (tmp_path / "cache").exists()
+
+
+def test_get_coverage_info__cache_merge(coverage_shards, tmp_path_factory):
+    cache_dir = tmp_path_factory.mktemp("cache")
+    shards = {path: path.read_bytes() for path in coverage_shards.glob(".coverage.*")}
+
+    expected = coverage.get_coverage_info(
+        merge=True,
+        coverage_path=coverage_shards,
+        loader="sqlite",
+        combine_workers=2,
+        cache_dir=cache_dir,
+    )
+    combined_lines = read_lines(coverage_shards)
+
+    # The CI starts over from the same shards
+    (coverage_shards / ".coverage").unlink()
+    for path, content in shards.items():
+        path.write_bytes(content)
+
+    result = coverage.get_coverage_info(
+        merge=True,
+        coverage_path=coverage_shards,
+        loader="sqlite",
+        combine_workers=2,
+        cache_dir=cache_dir,
+    )
+
+    assert result == expected
+    assert read_lines(coverage_shards) == combined_lines
+
+
+def test_get_coverage_info__cache_merge_missing_data_file(
+    mocker, coverage_shards, tmp_path_factory
+):
+    cache_dir = tmp_path_factory.mktemp("cache")
+    key = coverage.get_coverage_cache_key(coverage_path=coverage_shards, merge=True)
+    cache.write_json(cache_dir=cache_dir, namespace="coverage", key=key, value={})
+
+    _, result = coverage.get_coverage_info(
+        merge=True,
+        coverage_path=coverage_shards,
+        loader="sqlite",
+        combine_workers=2,
+        cache_dir=cache_dir,
+    )
+
+    assert result.info.num_statements == 20
+
+
+@pytest.mark.parametrize(
+    "path, coverage_path, expected",
+    [
+        ("a.py", ".", ["a.py"]),
+        ("sub/a.py", "sub", ["a.py"]),
+        ("a.py", "sub", []),
+        ("/repo/sub/a.py", "/repo/sub", ["a.py", "/repo/sub/a.py"]),
+        ("/elsewhere/a.py", "sub", ["/elsewhere/a.py"]),
+        ("./sub//a.py", "sub/", ["a.py"]),
+        ("sub2/a.py", "sub", []),
+    ],
+)
+def test_get_report_keys(path, coverage_path, expected):
+    prefix = coverage.get_path_prefix(coverage_path=pathlib.Path(coverage_path))
+
+    assert coverage.get_report_keys(path=path, prefix=prefix) == expected
+    assert coverage.get_report_keys(path=pathlib.Path(path), prefix=prefix) == expected
+
+
+def test_normalize_path():
+    path = coverage.normalize_path("".join(["a/", "./b.py"]))
+
+    assert path == "a/b.py"
+    assert path is coverage.normalize_path(pathlib.Path("a/b.py"))
+
+
+def test_get_coverage_info__paths(mocker, coverage_json):
+    load = mocker.patch(
+        "coverage_comment.coverage.load_coverage_json", return_value=coverage_json
+    )
+
+    coverage.get_coverage_info(
+        merge=False,
+        coverage_path=pathlib.Path("sub"),
+        paths=["sub/codebase/code.py", "other.py"],
+    )
+
+    assert load.call_args.kwargs["only_files"] == {"codebase/code.py"}
+
+
+def test_get_coverage_cache_key__only_files(line_coverage_data_dir):
+    key = coverage.get_coverage_cache_key(
+        coverage_path=line_coverage_data_dir, merge=False
+    )
+
+    assert key != coverage.get_coverage_cache_key(
+        coverage_path=line_coverage_data_dir, merge=False, only_files={"code.py"}
+    )
+
+
+def test_run_coverage_json__only_files(mocker, coverage_json):
+    mocker.patch(
+        "coverage_comment.subprocess.run", return_value=json.dumps(coverage_json)
+    )
+
+    result = coverage.run_coverage_json(
+        coverage_path=pathlib.Path("."), only_files={"codebase/other.py"}
+    )
+
+    assert result["files"] == {}
+    assert result["totals"] == coverage_json["totals"]
+
+
+@pytest.mark.parametrize(
+    "function", [coverage.generate_coverage_json, coverage.read_coverage_database]
+)
+def test_load_coverage__only_files(coverage_shards, function):
+    coverage.combine_coverage_files(coverage_path=coverage_shards, workers=2)
+
+    result = function(coverage_path=coverage_shards, only_files={"a.py"})
+
+    assert list(result["files"]) == ["a.py"]
+    assert result["totals"]["num_statements"] == 20
+    assert result["totals"]["covered_lines"] == 10
+
+
+def test_get_summary__no_branch():
+    numbers = Numbers(n_files=1, n_statements=4, n_excluded=1, n_missing=1)
+
+    assert coverage.get_summary(numbers=numbers, branch_coverage=False) == {
+        "covered_lines": 3,
+        "num_statements": 4,
+        "percent_covered": 75.0,
+        "percent_covered_display": "75",
+        "missing_lines": 1,
+        "excluded_lines": 1,
+    }
+
+
 def test_generate_coverage_html_files(mocker):
     run = mocker.patch(
         "coverage_comment.subprocess.run",
@@ -118,6 +892,159 @@ def test_generate_coverage_markdown(mocker):
     assert result == "foo"
 
 
+def test_line_numbers():
+    lines = coverage.LineNumbers([5, 1, 3])
+
+    assert len(lines) == 3
+    assert list(lines) == [1, 3, 5]
+    assert lines[0] == 1
+    assert lines[-1] == 5
+    assert lines[1:] == [3, 5]
+    assert isinstance(lines[1:], coverage.LineNumbers)
+    assert lines == (1, 3, 5)
+    assert lines == coverage.LineNumbers(lines)
+    assert lines != [1, 3]
+    assert lines != "135"
+    assert repr(lines) == "LineNumbers([1, 3, 5])"
+
+
+@pytest.mark.parametrize(
+    "line, expected",
+    [(3, True), (0, False), (2, False), (6, False), ("3", False)],
+)
+def test_line_numbers__contains(line, expected):
+    assert (line in coverage.LineNumbers([1, 3, 5])) is expected
+
+
+@pytest.mark.parametrize(
+    "start, end, expected",
+    [
+        (1, 6, [1, 3, 5]),
+        (3, 5, [3]),
+        (2, 3, []),
+        (4, 100, [5]),
+        (6, 10, []),
+    ],
+)
+def test_line_numbers__between(start, end, expected):
+    result = coverage.LineNumbers([1, 3, 5]).between(start, end)
+
+    assert isinstance(result, coverage.LineNumbers)
+    assert result == expected
+
+
+def test_arcs():
+    arcs = coverage.Arcs([[5, -1], [1, 3], [1, 2]])
+
+    assert len(arcs) == 3
+    assert list(arcs) == [(1, 2), (1, 3), (5, -1)]
+    assert arcs == [[1, 2], [1, 3], [5, -1]]
+    assert arcs == coverage.Arcs(arcs)
+    assert arcs != [(1, 2)]
+    assert arcs != "arcs"
+    assert repr(arcs) == "Arcs([(1, 2), (1, 3), (5, -1)])"
+
+
+@pytest.mark.parametrize(
+    "start, end, expected",
+    [
+        (1, 6, [(1, 2), (1, 3), (5, -1)]),
+        (1, 2, [(1, 2), (1, 3)]),
+        (2, 5, []),
+        (5, 100, [(5, -1)]),
+    ],
+)
+def test_arcs__between(start, end, expected):
+    arcs = coverage.Arcs([[1, 2], [1, 3], [5, -1]])
+
+    assert arcs.between(start, end) == expected
+
+
+def test_file_coverage__missing_branches(coverage_obj):
+    file = coverage_obj.files[pathlib.Path("codebase/code.py")]
+
+    assert file.missing_branches == []
+    file = dataclasses.replace(file, missing_branches=[[2, 4]])
+    assert isinstance(file.missing_branches, coverage.Arcs)
+    assert file.missing_branches == [(2, 4)]
+
+
+def test_file_coverage__line_numbers(coverage_obj):
+    file = coverage_obj.files[pathlib.Path("codebase/code.py")]
+
+    assert isinstance(file.executed_lines, coverage.LineNumbers)
+    assert file.executed_lines == [1, 2, 5, 6, 9]
+    assert file.excluded_lines == []
+
+
+@pytest.fixture
+def files_data(coverage_json):
+    file_data = coverage_json["files"]["codebase/code.py"]
+    return {"codebase/code.py": file_data, "/elsewhere/other.py": file_data}
+
+
+@pytest.mark.parametrize("coverage_path", [".", "sub", "/repo"])
+def test_file_coverages(files_data, coverage_path):
+    coverage_path = pathlib.Path(coverage_path)
+    files = coverage.FileCoverages(files_data=files_data, coverage_path=coverage_path)
+
+    assert len(files) == 2
+    assert list(files) == [
+        coverage_path / "codebase/code.py",
+        pathlib.Path("/elsewhere/other.py"),
+    ]
+    assert files[coverage_path / "codebase/code.py"].path == (
+        coverage_path / "codebase/code.py"
+    )
+    assert files[pathlib.Path("/elsewhere/other.py")].executed_lines == [1, 2, 5, 6, 9]
+    assert coverage_path / "codebase/code.py" in files
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "codebase/other.py",
+        "sub/codebase/other.py",
+        "/repo/codebase/code.py",
+        "codebase",
+    ],
+)
+def test_file_coverages__missing(files_data, path):
+    files = coverage.FileCoverages(
+        files_data=files_data, coverage_path=pathlib.Path("sub")
+    )
+
+    assert pathlib.Path(path) not in files
+    with pytest.raises(KeyError):
+        files[pathlib.Path(path)]
+
+
+def test_file_coverages__str(files_data):
+    files = coverage.FileCoverages(
+        files_data=files_data, coverage_path=pathlib.Path("sub")
+    )
+
+    assert "sub/codebase/code.py" in files
+    assert files["sub/codebase/code.py"].path == pathlib.Path("sub/codebase/code.py")
+    assert 1 not in files
+
+
+def test_file_coverages__lazy(mocker, files_data):
+    extract_file_info = mocker.patch(
+        "coverage_comment.coverage.extract_file_info",
+        side_effect=coverage.extract_file_info,
+    )
+    files = coverage.FileCoverages(
+        files_data=files_data, coverage_path=pathlib.Path(".")
+    )
+    assert extract_file_info.call_count == 0
+
+    file = files[pathlib.Path("codebase/code.py")]
+
+    assert files[pathlib.Path("codebase/code.py")] is file
+    assert extract_file_info.call_count == 1
+
+
 @pytest.mark.parametrize(
     "added_lines, update_obj, expected",
     [
@@ -126,17 +1053,17 @@ def test_generate_coverage_markdown(mocker):
         # Diff coverage should report that the violation is line 3 and
         # that the total coverage is 50%.
         (
-            {pathlib.Path("codebase/code.py"): [1, 3]},
+            {pathlib.Path("codebase/code.py"): [(1, 2), (3, 4)]},
             {"codebase/code.py": {"executed_lines": [1, 2], "missing_lines": [3]}},
             coverage.DiffCoverage(
                 total_num_lines=2,
                 total_num_violations=1,
-                total_percent_covered=decimal.Decimal("0.5"),
                 num_changed_lines=2,
                 files={
                     pathlib.Path("codebase/code.py"): coverage.FileDiffCoverage(
                         path=pathlib.Path("codebase/code.py"),
-                        percent_covered=decimal.Decimal("0.5"),
+                        covered_lines=1,
+                        num_lines=2,
                         violation_lines=[3],
                     )
                 },
@@ -148,12 +1075,11 @@ def test_generate_coverage_markdown(mocker):
         # imagine that the file code2.py only contains comments and is not
         # covered, nor imported.)
         (
-            {pathlib.Path("codebase/code2.py"): [1, 3]},
+            {pathlib.Path("codebase/code2.py"): [(1, 2), (3, 4)]},
             {"codebase/code.py": {"executed_lines": [1, 2], "missing_lines": [3]}},
             coverage.DiffCoverage(
                 total_num_lines=0,
                 total_num_violations=0,
-                total_percent_covered=decimal.Decimal("1"),
                 num_changed_lines=2,
                 files={},
             ),
@@ -162,17 +1088,17 @@ def test_generate_coverage_markdown(mocker):
         # the modified files and the files that received coverage info. We
         # should not report any violation (and 100% coverage)
         (
-            {pathlib.Path("codebase/code.py"): [4, 5, 6]},
+            {pathlib.Path("codebase/code.py"): [(4, 7)]},
             {"codebase/code.py": {"executed_lines": [1, 2, 3], "missing_lines": [7]}},
             coverage.DiffCoverage(
                 total_num_lines=0,
                 total_num_violations=0,
-                total_percent_covered=decimal.Decimal("1"),
                 num_changed_lines=3,
                 files={
                     pathlib.Path("codebase/code.py"): coverage.FileDiffCoverage(
                         path=pathlib.Path("codebase/code.py"),
-                        percent_covered=decimal.Decimal("1"),
+                        covered_lines=0,
+                        num_lines=0,
                         violation_lines=[],
                     )
                 },
@@ -183,8 +1109,8 @@ def test_generate_coverage_markdown(mocker):
         # stats are correct.
         (
             {
-                pathlib.Path("codebase/code.py"): [4, 5, 6],
-                pathlib.Path("codebase/other.py"): [10, 13],
+                pathlib.Path("codebase/code.py"): [(4, 7)],
+                pathlib.Path("codebase/other.py"): [(10, 11), (13, 14)],
             },
             {
                 "codebase/code.py": {
@@ -199,17 +1125,18 @@ def test_generate_coverage_markdown(mocker):
             coverage.DiffCoverage(
                 total_num_lines=4,  # 2 lines in code.py + 2 lines in other.py
                 total_num_violations=1,  # 1 line in other.py
-                total_percent_covered=decimal.Decimal("0.75"),  # 3/4 lines covered
                 num_changed_lines=5,  # 3 lines in code.py + 2 lines in other.py
                 files={
                     pathlib.Path("codebase/code.py"): coverage.FileDiffCoverage(
                         path=pathlib.Path("codebase/code.py"),
-                        percent_covered=decimal.Decimal("1"),
+                        covered_lines=2,
+                        num_lines=2,
                         violation_lines=[],
                     ),
                     pathlib.Path("codebase/other.py"): coverage.FileDiffCoverage(
                         path=pathlib.Path("codebase/other.py"),
-                        percent_covered=decimal.Decimal("0.5"),
+                        covered_lines=1,
+                        num_lines=2,
                         violation_lines=[13],
                     ),
                 },
@@ -217,24 +1144,331 @@ def test_generate_coverage_markdown(mocker):
         ),
     ],
 )
-def test_get_diff_coverage_info(make_coverage_obj, added_lines, update_obj, expected):
+@pytest.mark.parametrize("engine", sorted(coverage.DIFF_COVERAGE_ENGINES))
+def test_get_diff_coverage_info(
+    make_coverage_obj, added_lines, update_obj, expected, engine
+):
     result = coverage.get_diff_coverage_info(
-        added_lines=added_lines, coverage=make_coverage_obj(**update_obj)
+        added_lines=added_lines,
+        coverage=make_coverage_obj(**update_obj),
+        engine=engine,
     )
     assert result == expected
 
 
+def test_get_diff_coverage_info__missing_branches(make_coverage_obj):
+    cov = make_coverage_obj(
+        **{
+            "codebase/code.py": {
+                "executed_lines": [1, 2, 3, 9],
+                "missing_lines": [8],
+                "missing_branches": [[2, 7], [3, -1], [9, 10]],
+            }
+        }
+    )
+
+    result = coverage.get_diff_coverage_info(
+        added_lines={pathlib.Path("codebase/code.py"): [(2, 4)]}, coverage=cov
+    )
+
+    file = result.files[pathlib.Path("codebase/code.py")]
+    assert file.percent_covered == 1
+    assert file.missing_branches == [(2, 7), (3, -1)]
+
+
+def test_get_diff_coverage_info__missing_branches_of_missing_lines(
+    make_coverage_obj,
+):
+    # 1 def d(a):
+    # 2     if a:
+    # 3         return b()
+    # 4     return c()  <- never run
+    # 5
+    # 6 def e(f):
+    # 7     if f:  <- never run, so neither of its branches is taken
+    # 8         g()
+    # 9     h()
+    cov = make_coverage_obj(
+        **{
+            "codebase/code.py": {
+                "executed_lines": [1, 2, 3, 6],
+                "missing_lines": [4, 7, 8, 9],
+                "missing_branches": [[2, 4], [7, 8], [7, 9]],
+            }
+        }
+    )
+
+    result = coverage.get_diff_coverage_info(
+        added_lines={pathlib.Path("codebase/code.py"): [(1, 10)]}, coverage=cov
+    )
+
+    file = result.files[pathlib.Path("codebase/code.py")]
+    assert file.violation_lines == [4, 7, 8, 9]
+    assert file.missing_branches == []
+
+
+def test_get_diff_coverage_info__unknown_engine(coverage_obj):
+    with pytest.raises(ValueError):
+        coverage.get_diff_coverage_info(
+            added_lines={}, coverage=coverage_obj, engine="foo"
+        )
+
+
 def test_get_added_lines(git):
     diff = (
         """+++ b/README.md\n@@ -1,2 +1,3 @@\n-# coverage-comment\n+coverage-comment\n"""
     )
-    git.register("git fetch origin main --depth=1000")()
-    git.register("git diff --unified=0 FETCH_HEAD -- .")(stdout=diff)
-    assert coverage.get_added_lines(git=git, base_ref="main") == {
-        pathlib.Path("README.md"): [1, 2, 3]
+    git.register("git rev-parse --is-shallow-repository HEAD")(stdout="false\nabc\n")
+    git.register("git count-objects -v")()
+    git.register("git fetch --filter=blob:none --depth=50 origin main")()
+    git.register("git merge-base FETCH_HEAD HEAD")(stdout="def\n")
+    git.register("git count-objects -v")()
+    git.register("git diff --unified=0 def -- .")(stdout=diff)
+    assert coverage.get_added_lines(git=git, base_ref="main") == {"README.md": [(1, 4)]}
+
+
+def test_get_added_lines__pathspec(git):
+    git.register("git rev-parse --is-shallow-repository HEAD")(stdout="false\nabc\n")
+    git.register("git count-objects -v")()
+    git.register("git fetch --filter=blob:none --depth=50 origin main")()
+    git.register("git merge-base FETCH_HEAD HEAD")(stdout="def\n")
+    git.register("git count-objects -v")()
+    git.register("git diff --unified=0 def -- src :!src/vendor")()
+
+    assert (
+        coverage.get_added_lines(
+            git=git, base_ref="main", pathspec=["src", ":!src/vendor"]
+        )
+        == {}
+    )
+
+
+def test_get_added_lines__cache(git, tmp_path):
+    diff = """+++ b/README.md\n@@ -1,2 +1,3 @@\n@@ -8 +9,0 @@\n@@ -10 +10 @@\n"""
+    git.register("git rev-parse HEAD")(stdout="abc\n")
+    git.register("git ls-remote origin refs/heads/main")(
+        stdout="123\trefs/heads/main\n"
+    )
+    git.register("git rev-parse --is-shallow-repository HEAD")(stdout="false\nabc\n")
+    git.register("git count-objects -v")()
+    git.register("git fetch --filter=blob:none --depth=50 origin main")()
+    git.register("git merge-base FETCH_HEAD HEAD")(stdout="def\n")
+    git.register("git count-objects -v")()
+    git.register("git diff --unified=0 def -- .")(stdout=diff)
+    expected = {"README.md": [(1, 4), (10, 11)]}
+
+    result = coverage.get_added_lines(git=git, base_ref="main", cache_dir=tmp_path)
+    assert result == expected
+
+    # Same commits: nothing is fetched
+    git.register("git rev-parse HEAD")(stdout="abc\n")
+    git.register("git ls-remote origin refs/heads/main")(
+        stdout="123\trefs/heads/main\n"
+    )
+    result = coverage.get_added_lines(git=git, base_ref="main", cache_dir=tmp_path)
+    assert result == expected
+
+
+def test_get_added_lines__cache_other_commits(git, tmp_path):
+    for base in ["123", "456"]:
+        git.register("git rev-parse HEAD")(stdout="abc\n")
+        git.register("git ls-remote origin refs/heads/main")(
+            stdout=f"{base}\trefs/heads/main\n"
+        )
+        git.register("git rev-parse --is-shallow-repository HEAD")(
+            stdout="false\nabc\n"
+        )
+        git.register("git count-objects -v")()
+        git.register("git fetch --filter=blob:none --depth=50 origin main")()
+        git.register("git merge-base FETCH_HEAD HEAD")(stdout="def\n")
+        git.register("git count-objects -v")()
+        git.register("git diff --unified=0 def -- .")()
+
+        coverage.get_added_lines(git=git, base_ref="main", cache_dir=tmp_path)
+
+    assert len(list((tmp_path / "diff").iterdir())) == 2
+
+
+def test_get_added_lines__cache_no_key(git, tmp_path):
+    git.register("git rev-parse HEAD")(stdout="abc\n")
+    git.register("git ls-remote origin refs/heads/main")()
+    git.register("git rev-parse --is-shallow-repository HEAD")(stdout="false\nabc\n")
+    git.register("git count-objects -v")()
+    git.register("git fetch --filter=blob:none --depth=50 origin main")()
+    git.register("git merge-base FETCH_HEAD HEAD")(stdout="def\n")
+    git.register("git count-objects -v")()
+    git.register("git diff --unified=0 def -- .")()
+
+    coverage.get_added_lines(git=git, base_ref="main", cache_dir=tmp_path)
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_get_diff_cache_key(git):
+    git.register("git rev-parse HEAD")(stdout="abc\n")
+    git.register("git ls-remote origin refs/heads/main")(
+        stdout="123\trefs/heads/main\n"
+    )
+
+    assert coverage.get_diff_cache_key(
+        git=git, base_ref="main", pathspec=["src"]
+    ) == cache.get_key("123", "abc", "src")
+
+
+def test_get_diff_cache_key__git_error(git):
+    git.register("git rev-parse HEAD")(exit_code=128)
+
+    assert coverage.get_diff_cache_key(git=git, base_ref="main", pathspec=["."]) is None
+
+
+def write_measured_files(path, measured_files, suffix=None):
+    data = coveragepy.CoverageData(basename=str(path / ".coverage"), suffix=suffix)
+    data.add_lines({file: {1} for file in measured_files})
+    data.write()
+
+
+def test_get_measured_directories(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_measured_files(
+        tmp_path,
+        [
+            str(tmp_path / "src" / "pkg" / "a.py"),
+            str(tmp_path / "src" / "pkg" / "sub" / "b.py"),
+            str(tmp_path / "src" / "pkg-extra" / "c.py"),
+            # With relative_files
+            "tools/d.py",
+        ],
+    )
+
+    assert coverage.get_measured_directories(
+        coverage_path=pathlib.Path("."), merge=False
+    ) == ["src/pkg", "src/pkg-extra", "tools"]
+
+
+def test_get_measured_directories__merge(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "sub").mkdir()
+    write_measured_files(tmp_path / "sub", ["a/a.py"], suffix="shard1")
+    write_measured_files(tmp_path / "sub", ["b/b.py"], suffix="shard2")
+
+    assert coverage.get_measured_directories(
+        coverage_path=pathlib.Path("sub"), merge=True
+    ) == ["sub/a", "sub/b"]
+
+
+@pytest.mark.parametrize(
+    "measured_files",
+    [
+        # The whole repository
+        ["a.py", "src/b.py"],
+        # Measured somewhere else
+        ["/elsewhere/a.py", "src/b.py"],
+        # Nothing measured
+        [],
+    ],
+)
+def test_get_measured_directories__none(tmp_path, monkeypatch, measured_files):
+    monkeypatch.chdir(tmp_path)
+    write_measured_files(tmp_path, measured_files)
+
+    assert (
+        coverage.get_measured_directories(coverage_path=pathlib.Path("."), merge=False)
+        is None
+    )
+
+
+def test_get_measured_directories__invalid_data(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".coverage").write_text("foo")
+
+    assert (
+        coverage.get_measured_directories(coverage_path=pathlib.Path("."), merge=False)
+        is None
+    )
+
+
+def test_parse_patch():
+    patch = """@@ -1,4 +1,5 @@
+ a
+-b
++b1
++b2
+ c
+ d
+@@ -10,3 +11,4 @@ def foo():
+ x
++y
+ z
++w
+\\ No newline at end of file"""
+    assert coverage.parse_patch(patch) == [(2, 4), (12, 13), (14, 15)]
+
+
+def test_parse_patch__deleted_file():
+    assert coverage.parse_patch("@@ -1,2 +0,0 @@\n-a\n-b") == []
+
+
+def test_get_pr_added_lines(git):
+    pr_files = [
+        {"filename": "a.py", "additions": 1, "patch": "@@ -0,0 +1 @@\n+a"},
+        {"filename": "b.py", "additions": 0, "patch": "@@ -1 +0,0 @@\n-b"},
+        # Binary
+        {"filename": "c.png", "additions": 0},
+    ]
+
+    assert coverage.get_pr_added_lines(pr_files=pr_files, git=git, base_ref="main") == {
+        "a.py": [(1, 2)]
+    }
+
+
+def test_get_pr_added_lines__truncated(git):
+    pr_files = [
+        {"filename": "a.py", "additions": 1, "patch": "@@ -0,0 +1 @@\n+a"},
+        {"filename": "big.py", "additions": 5000},
+    ]
+    git.register("git rev-parse --is-shallow-repository HEAD")(stdout="false\nabc\n")
+    git.register("git count-objects -v")()
+    git.register("git fetch --filter=blob:none --depth=50 origin main")()
+    git.register("git merge-base FETCH_HEAD HEAD")(stdout="def\n")
+    git.register("git count-objects -v")()
+    git.register("git diff --unified=0 def -- :(literal)big.py")(
+        stdout="+++ b/big.py\n@@ -0,0 +1,5000 @@\n"
+    )
+
+    assert coverage.get_pr_added_lines(pr_files=pr_files, git=git, base_ref="main") == {
+        "a.py": [(1, 2)],
+        "big.py": [(1, 5001)],
     }
 
 
+def test_fetch_merge_base__deepen(git, caplog):
+    caplog.set_level("INFO")
+    git.register("git rev-parse --is-shallow-repository HEAD")(stdout="true\nabc\n")
+    git.register("git count-objects -v")(stdout="count: 3\nsize: 12\nsize-pack: 100\n")
+    git.register("git fetch --filter=blob:none --depth=50 origin main abc")()
+    git.register("git merge-base FETCH_HEAD HEAD")(exit_code=1)
+    git.register("git fetch --filter=blob:none --deepen=100 origin main abc")()
+    git.register("git merge-base FETCH_HEAD HEAD")(stdout="def\n")
+    git.register("git count-objects -v")(stdout="count: 5\nsize: 20\nsize-pack: 150\n")
+
+    assert coverage.fetch_merge_base(git=git, base_ref="main") == "def"
+    assert "Fetched main in 2 round trips, downloading 58 KiB" in caplog.text
+
+
+def test_fetch_merge_base__not_found(git, mocker, caplog):
+    mocker.patch("coverage_comment.coverage.MAX_FETCHES", 2)
+    git.register("git rev-parse --is-shallow-repository HEAD")(stdout="false\nabc\n")
+    git.register("git count-objects -v")()
+    git.register("git fetch --filter=blob:none --depth=50 origin main")()
+    git.register("git merge-base FETCH_HEAD HEAD")(exit_code=1)
+    git.register("git fetch --filter=blob:none --deepen=100 origin main")()
+    git.register("git merge-base FETCH_HEAD HEAD")(exit_code=1)
+    git.register("git count-objects -v")()
+
+    assert coverage.fetch_merge_base(git=git, base_ref="main") == "FETCH_HEAD"
+    assert "Could not find where HEAD branched off main" in caplog.text
+
+
 @pytest.mark.parametrize(
     "line_number_diff_line, expected",
     [
@@ -285,9 +1519,9 @@ rename to coverage_comment/annotations2.py
 """
     git.register("git fetch origin main --depth=1000")()
     git.register("git diff --unified=0 FETCH_HEAD -- .")(stdout=diff)
-    assert coverage.parse_diff_output(diff=diff) == {
-        pathlib.Path("README.md"): [1, 3, 4, 5, 6],
-        pathlib.Path("foo.txt"): [1],
+    assert coverage.parse_diff_output(diff_lines=diff.splitlines(keepends=True)) == {
+        "README.md": [(1, 2), (3, 7)],
+        "foo.txt": [(1, 2)],
     }
 
 
@@ -301,4 +1535,4 @@ index 1f1d9a4..e69de29 100644
     git.register("git fetch origin main --depth=1000")()
     git.register("git diff --unified=0 FETCH_HEAD -- .")(stdout=diff)
     with pytest.raises(ValueError):
-        coverage.parse_diff_output(diff=diff)
+        coverage.parse_diff_output(diff_lines=diff.splitlines(keepends=True))
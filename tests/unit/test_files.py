@@ -83,21 +83,18 @@ def test_get_urls():
     }
 
 
-def test_get_coverage_html_files(mocker, in_tmp_path):
-    def gen_side_effect(destination, coverage_path):
-        (destination / ".gitignore").touch()
-        (destination / "index.html").touch()
-
-    gen = mocker.patch(
-        "coverage_comment.coverage.generate_coverage_html_files",
-        side_effect=gen_side_effect,
-    )
-    gen_dir = in_tmp_path / "gen"
-    gen_dir.mkdir()
-    rep = files.get_coverage_html_files(gen_dir=gen_dir, coverage_path=".")
-    (source_htmlcov,) = gen_dir.iterdir()
+def test_make_html_dir(tmp_path):
+    html_dir = files.make_html_dir(gen_dir=tmp_path)
+
+    assert html_dir.parent == tmp_path
+    assert html_dir.is_dir()
+
+
+def test_get_coverage_html_files(tmp_path):
+    (tmp_path / ".gitignore").touch()
+    (tmp_path / "index.html").touch()
 
-    assert rep == files.ReplaceDir(path=pathlib.Path("htmlcov"), source=source_htmlcov)
+    rep = files.get_coverage_html_files(html_dir=tmp_path)
 
-    assert gen.called is True
-    assert not (source_htmlcov / "gitignore").exists()
+    assert rep == files.ReplaceDir(path=pathlib.Path("htmlcov"), source=tmp_path)
+    assert not (tmp_path / ".gitignore").exists()
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import httpx
 import pytest
 
 from coverage_comment import github_client
@@ -19,6 +20,377 @@ def test_github_client__post_non_json(session, gh):
     gh.repos("a/b").issues().post(a=1)
 
 
+def link_header(path, last_page):
+    return {
+        "link": (
+            f'<https://api.github.com{path}?per_page=100&page=2>; rel="next", '
+            f'<https://api.github.com{path}?per_page=100&page={last_page}>; rel="last"'
+        )
+    }
+
+
+def test_github_client__paginate(session, gh):
+    path = "/repos/a/b/issues"
+    session.register("GET", path, params={"a": 1, "per_page": 100, "page": 1})(
+        json=[1, 2], headers=link_header(path, last_page=3)
+    )
+    session.register("GET", path, params={"a": 1, "per_page": 100, "page": 2})(
+        json=[3, 4]
+    )
+    session.register("GET", path, params={"a": 1, "per_page": 100, "page": 3})(json=[5])
+
+    assert list(gh.repos("a/b").issues.paginate(a=1)) == [1, 2, 3, 4, 5]
+
+
+def test_github_client__paginate_single_page(session, gh):
+    session.register("GET", "/repos/a/b/issues", params={"per_page": 100, "page": 1})(
+        json=[1, 2]
+    )
+
+    assert list(gh.repos("a/b").issues.paginate()) == [1, 2]
+
+
+def test_github_client__paginate_stop(session, gh):
+    path = "/repos/a/b/issues"
+    session.register("GET", path, params={"per_page": 100, "page": 1})(
+        json=[1, 2], headers=link_header(path, last_page=5)
+    )
+    for page in range(2, 6):
+        session.register("GET", path, params={"per_page": 100, "page": page})(
+            json=[2 * page - 1, 2 * page]
+        )
+
+    for item in gh.repos("a/b").issues.paginate(workers=2):
+        if item == 3:
+            break
+
+    # Pages 2 and 3 were fetched ahead, then page 4 when page 2 was read
+    assert [kwargs["params"]["page"] for kwargs, _ in session.responses] == [5]
+    session.responses.clear()
+
+
+def test_get_last_page():
+    response = httpx.Response(
+        status_code=200, headers=link_header("/repos/a/b/issues", last_page=7)
+    )
+
+    assert github_client.get_last_page(response) == 7
+
+
+def test_github_client__cache(session, tmp_path):
+    gh = github_client.GitHub(session=session, cache_dir=tmp_path)
+    session.register("GET", "/repos/a/b", params={"a": 1})(
+        json={"foo": "bar"},
+        headers={"etag": '"abc"', "last-modified": "Tue, 01 Oct 2024 00:00:00 GMT"},
+    )
+    session.register(
+        "GET",
+        "/repos/a/b",
+        params={"a": 1},
+        headers={
+            "If-None-Match": '"abc"',
+            "If-Modified-Since": "Tue, 01 Oct 2024 00:00:00 GMT",
+        },
+    )(status_code=304)
+
+    assert gh.repos("a/b").get(a=1) == {"foo": "bar"}
+    assert gh.repos("a/b").get(a=1) == {"foo": "bar"}
+    assert (gh.cache_hits, gh.cache_misses) == (1, 1)
+
+
+def test_github_client__cache_modified(session, tmp_path):
+    gh = github_client.GitHub(session=session, cache_dir=tmp_path)
+    session.register("GET", "/repos/a/b")(json={"foo": "bar"}, headers={"etag": "1"})
+    session.register("GET", "/repos/a/b", headers={"If-None-Match": "1"})(
+        json={"foo": "baz"}, headers={"etag": "2"}
+    )
+    session.register("GET", "/repos/a/b", headers={"If-None-Match": "2"})(
+        status_code=304
+    )
+
+    assert gh.repos("a/b").get() == {"foo": "bar"}
+    assert gh.repos("a/b").get() == {"foo": "baz"}
+    assert gh.repos("a/b").get() == {"foo": "baz"}
+    assert (gh.cache_hits, gh.cache_misses) == (1, 2)
+
+
+def test_github_client__cache_paginate(session, tmp_path):
+    gh = github_client.GitHub(session=session, cache_dir=tmp_path)
+    path = "/repos/a/b/issues"
+    page_1 = {"per_page": 100, "page": 1}
+    page_2 = {"per_page": 100, "page": 2}
+    session.register("GET", path, params=page_1)(
+        json=[1, 2], headers=link_header(path, last_page=2) | {"etag": "1"}
+    )
+    session.register("GET", path, params=page_2)(json=[3], headers={"etag": "2"})
+    session.register("GET", path, params=page_1, headers={"If-None-Match": "1"})(
+        status_code=304
+    )
+    session.register("GET", path, params=page_2, headers={"If-None-Match": "2"})(
+        status_code=304
+    )
+
+    assert list(gh.repos("a/b").issues.paginate()) == [1, 2, 3]
+    # The cached first page still tells how many pages there are
+    assert list(gh.repos("a/b").issues.paginate()) == [1, 2, 3]
+    assert gh.cache_hits == 2
+
+
+def test_github_client__cache_no_validators(session, tmp_path):
+    gh = github_client.GitHub(session=session, cache_dir=tmp_path)
+    session.register("GET", "/repos/a/b")(json={"foo": "bar"})
+    session.register("POST", "/repos/a/b")(headers={"etag": "1"})
+
+    gh.repos("a/b").get()
+    gh.repos("a/b").post()
+
+    assert list(tmp_path.iterdir()) == []
+    assert (gh.cache_hits, gh.cache_misses) == (0, 1)
+
+
+@pytest.fixture
+def fake_time(mocker):
+    """
+    Time passes only when sleeping
+    """
+    time = mocker.patch("coverage_comment.github_client.time")
+    time.time.return_value = 1000.0
+    time.monotonic.side_effect = lambda: time.time.return_value
+
+    def sleep(delay):
+        time.time.return_value += delay
+
+    time.sleep.side_effect = sleep
+    return time
+
+
+def test_github_client__rate_limit_remaining(session, gh, fake_time):
+    session.register("GET", "/user")(headers={"x-ratelimit-remaining": "42"})
+
+    gh.user.get()
+
+    assert gh.rate_limit_remaining == 42
+    fake_time.sleep.assert_not_called()
+
+
+def test_github_client__rate_limit_exhausted(session, gh, fake_time):
+    headers = {"x-ratelimit-remaining": "0", "x-ratelimit-reset": "1010"}
+    session.register("GET", "/user")(headers=headers)
+    session.register("GET", "/repos")()
+
+    gh.user.get()
+    gh.repos.get()
+
+    fake_time.sleep.assert_called_once_with(10.0)
+
+
+def test_github_client__rate_limit_too_long(session, gh, fake_time):
+    headers = {"x-ratelimit-remaining": "0", "x-ratelimit-reset": "5000"}
+    session.register("GET", "/user")(headers=headers)
+
+    gh.user.get()
+    with pytest.raises(github_client.RateLimited):
+        gh.repos.get()
+
+    fake_time.sleep.assert_not_called()
+
+
+def test_github_client__rate_limit_retry_after(session, gh, fake_time, get_logs):
+    session.register("GET", "/user")(status_code=403, headers={"retry-after": "30"})
+    session.register("GET", "/user")(json={"login": "foo"})
+
+    assert gh.user.get() == {"login": "foo"}
+
+    fake_time.sleep.assert_called_once_with(30.0)
+    assert get_logs("INFO", "GET /user was rate limited by GitHub, retrying (1/3)")
+
+
+def test_github_client__secondary_rate_limit(session, gh, fake_time):
+    session.register("POST", "/repos")(
+        status_code=403,
+        headers={"x-ratelimit-remaining": "4000"},
+        json={"message": "You have exceeded a secondary rate limit."},
+    )
+    session.register("POST", "/repos")()
+
+    gh.repos.post()
+
+    fake_time.sleep.assert_called_once_with(60.0)
+
+
+def test_github_client__forbidden_not_rate_limited(session, gh, fake_time):
+    session.register("GET", "/user")(
+        status_code=403, headers={"x-ratelimit-remaining": "4000"}, json={}
+    )
+
+    with pytest.raises(github_client.Forbidden):
+        gh.user.get()
+
+    fake_time.sleep.assert_not_called()
+
+
+def test_github_client__rate_limit_low(session, gh, fake_time):
+    headers = {"x-ratelimit-remaining": "10", "x-ratelimit-reset": "1005"}
+    session.register("GET", "/user")(headers=headers)
+    session.register("GET", "/repos")()
+    session.register("GET", "/repos")()
+
+    gh.user.get()
+    gh.repos.get()
+    gh.repos.get()
+
+    # The 10 remaining requests are spread over the 5s until the reset
+    fake_time.sleep.assert_called_once_with(0.5)
+
+
+def test_github_client__rate_limit_low_far_reset(session, gh, fake_time, mocker):
+    headers = {"x-ratelimit-remaining": "8", "x-ratelimit-reset": "4000"}
+    session.register("GET", "/user")(headers=headers)
+    for _ in range(5):
+        session.register("GET", "/repos")(headers=headers)
+
+    gh.user.get()
+    for _ in range(5):
+        gh.repos.get()
+
+    # Budget is left: requests are slowed down, within reason, but don't fail
+    assert fake_time.sleep.call_args_list == [mocker.call(1.0)] * 4
+
+
+def test_github_client__rate_limit_retries(session, gh, fake_time):
+    headers = {"x-ratelimit-remaining": "0", "x-ratelimit-reset": "1001"}
+    for _ in range(4):
+        session.register("GET", "/user")(status_code=429, headers=headers)
+
+    with pytest.raises(github_client.RateLimited) as exc_info:
+        gh.user.get()
+
+    assert str(exc_info.value) == "GET /user was rate limited by GitHub 4 times"
+
+
+def test_github_client__mutation_interval(session, gh, fake_time):
+    session.register("POST", "/repos")()
+    session.register("GET", "/repos")()
+    session.register("PATCH", "/repos")()
+
+    gh.repos.post()
+    gh.repos.get()
+    gh.repos.patch()
+
+    fake_time.sleep.assert_called_once_with(1.0)
+
+
+def test_github_client__rate_limit_fake_server(fake_time):
+    requests = []
+
+    def api(request):
+        requests.append(fake_time.time())
+        if len(requests) == 1:
+            return httpx.Response(
+                status_code=429, headers={"retry-after": "60"}, json={}
+            )
+        return httpx.Response(
+            status_code=200,
+            headers={"x-ratelimit-remaining": "4999"},
+            json={"login": "foo"},
+        )
+
+    session = httpx.Client(
+        base_url="https://api.github.test", transport=httpx.MockTransport(api)
+    )
+    gh = github_client.GitHub(session=session)
+
+    assert gh.user.get() == {"login": "foo"}
+    assert requests == [1000.0, 1060.0]
+    assert gh.rate_limit_remaining == 4999
+
+
+@pytest.fixture
+def max_backoff(mocker):
+    """
+    No jitter: always wait for the maximum backoff
+    """
+    mocker.patch(
+        "coverage_comment.github_client.random.uniform", side_effect=lambda a, b: b
+    )
+
+
+def test_github_client__retry(session, gh, fake_time, max_backoff, get_logs, mocker):
+    session.register("GET", "/user")(status_code=502)
+    session.register("GET", "/user")(status_code=503)
+    session.register("GET", "/user")(json={"login": "foo"})
+
+    assert gh.user.get() == {"login": "foo"}
+
+    assert fake_time.sleep.call_args_list == [mocker.call(1), mocker.call(2)]
+    assert get_logs(
+        "WARNING", "GET /user failed after 0.0s (HTTP 502), retrying in 1.0s (1/3)"
+    )
+    assert get_logs(
+        "WARNING", "GET /user failed after 0.0s (HTTP 503), retrying in 2.0s (2/3)"
+    )
+
+
+def test_github_client__retry_exhausted(session, gh, fake_time, max_backoff):
+    for _ in range(4):
+        session.register("GET", "/user")(status_code=500)
+
+    with pytest.raises(github_client.ApiError):
+        gh.user.get()
+
+    assert fake_time.sleep.call_count == 3
+
+
+def test_github_client__retry_not_idempotent(session, gh, fake_time):
+    session.register("POST", "/repos")(status_code=502)
+
+    with pytest.raises(github_client.ApiError):
+        gh.repos.post()
+
+    fake_time.sleep.assert_not_called()
+
+
+def test_github_client__retry_budget(session, fake_time, max_backoff, get_logs):
+    gh = github_client.GitHub(session=session, retry_budget=1.5)
+    session.register("GET", "/user")(status_code=502)
+    session.register("GET", "/user")()
+    session.register("GET", "/repos")(status_code=502)
+
+    gh.user.get()
+    with pytest.raises(github_client.ApiError):
+        gh.repos.get()
+
+    fake_time.sleep.assert_called_once_with(1)
+    assert get_logs("WARNING", "The time budget for retrying requests is exhausted")
+
+
+def test_github_client__retry_transport_error(fake_time, max_backoff, get_logs):
+    attempts = []
+
+    def api(request):
+        attempts.append(request.method)
+        if len(attempts) == 1:
+            fake_time.time.return_value += 60
+            raise httpx.ReadTimeout("Timed out", request=request)
+        if request.method == "POST":
+            raise httpx.ConnectError("Connection reset", request=request)
+        return httpx.Response(status_code=200, json={"login": "foo"})
+
+    session = httpx.Client(
+        base_url="https://api.github.test", transport=httpx.MockTransport(api)
+    )
+    gh = github_client.GitHub(session=session)
+
+    assert gh.user.get() == {"login": "foo"}
+    assert get_logs(
+        "WARNING",
+        "GET /user failed after 60.0s (ReadTimeout: Timed out), retrying in 1.0s",
+    )
+    with pytest.raises(httpx.ConnectError):
+        gh.user.post()
+    assert attempts == ["GET", "GET", "POST"]
+
+
 def test_json_object():
     obj = github_client.JsonObject({"a": 1})
 
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import io
+import json
+
+import pytest
+
+from coverage_comment import json_stream
+
+
+def read(reader: json_stream.JSONStreamReader) -> dict:
+    """
+    Read an object with the reader, going into nested objects under "nested"
+    """
+    result = {}
+    for key in reader.iter_object_keys():
+        if key == "nested":
+            result[key] = read(reader)
+        else:
+            result[key] = reader.read_value()
+    return result
+
+
+DOCUMENT = {
+    "a": {"b": [1, 2, 3], "c": "d"},
+    "nested": {"e": 12345, "f": {}, "nested": {}, "g": 'h é \\ "'},
+    "i": 1.5,
+}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 2**16])
+@pytest.mark.parametrize("indent", [None, 4])
+def test_json_stream_reader(chunk_size, indent):
+    reader = json_stream.JSONStreamReader(
+        file=io.StringIO(json.dumps(DOCUMENT, indent=indent)), chunk_size=chunk_size
+    )
+
+    assert read(reader) == DOCUMENT
+
+
+def test_json_stream_reader__empty():
+    reader = json_stream.JSONStreamReader(file=io.StringIO(" { } "))
+
+    assert read(reader) == {}
+
+
+def test_json_stream_reader__number_at_end():
+    reader = json_stream.JSONStreamReader(file=io.StringIO("12345"), chunk_size=2)
+
+    assert reader.read_value() == 12345
+
+
+@pytest.mark.parametrize(
+    "document",
+    ["", "[]", '{"a" 1}', '{"a": 1 "b": 2}', "{1: 2}", '{"a": [1, 2}', '{"a": 1'],
+)
+def test_json_stream_reader__invalid(document):
+    reader = json_stream.JSONStreamReader(file=io.StringIO(document), chunk_size=2)
+
+    with pytest.raises(json.JSONDecodeError):
+        read(reader)
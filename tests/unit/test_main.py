@@ -63,3 +63,77 @@ def test_main__exception(mocker, get_logs):
     exit.assert_called_with(1)
 
     assert get_logs("ERROR", "Critical error")
+
+
+def test_get_added_lines__api(pull_request_config, gh, session, git):
+    git.register("git rev-parse HEAD")(stdout="abc\n")
+    session.register("GET", "/repos/py-cov-action/foobar/pulls/2")(
+        json={"changed_files": 1, "head": {"sha": "abc"}}
+    )
+    session.register(
+        "GET",
+        "/repos/py-cov-action/foobar/pulls/2/files",
+        params={"per_page": 100, "page": 1},
+    )(json=[{"filename": "a.py", "additions": 1, "patch": "@@ -0,0 +1 @@\n+a"}])
+
+    result = main.get_added_lines(
+        config=pull_request_config(DIFF_SOURCE="api"), gh=gh, git=git, base_ref="main"
+    )
+
+    assert result == {"a.py": [(1, 2)]}
+
+
+def test_get_added_lines__api_too_many_files(
+    pull_request_config, gh, session, git, get_logs
+):
+    git.register("git rev-parse HEAD")(stdout="abc\n")
+    session.register("GET", "/repos/py-cov-action/foobar/pulls/2")(
+        json={"changed_files": 5000, "head": {"sha": "abc"}}
+    )
+    git.register("git rev-parse --is-shallow-repository HEAD")(stdout="false\nabc\n")
+    git.register("git count-objects -v")()
+    git.register("git fetch --filter=blob:none --depth=50 origin main")()
+    git.register("git merge-base FETCH_HEAD HEAD")(stdout="def\n")
+    git.register("git count-objects -v")()
+    git.register("git diff --unified=0 def -- src")(
+        stdout="+++ b/src/a.py\n@@ -0,0 +1 @@\n+a\n"
+    )
+
+    result = main.get_added_lines(
+        config=pull_request_config(DIFF_SOURCE="api", DIFF_PATHSPEC=["src"]),
+        gh=gh,
+        git=git,
+        base_ref="main",
+    )
+
+    assert result == {"src/a.py": [(1, 2)]}
+    assert get_logs("INFO", "computing the diff with git")
+
+
+def test_get_added_lines__api_head_mismatch(
+    pull_request_config, gh, session, git, get_logs
+):
+    # The merge commit of the PR is checked out: the line numbers of the API
+    # patches (those of the PR head) may not match it
+    git.register("git rev-parse HEAD")(stdout="merge\n")
+    session.register("GET", "/repos/py-cov-action/foobar/pulls/2")(
+        json={"changed_files": 1, "head": {"sha": "abc"}}
+    )
+    git.register("git rev-parse --is-shallow-repository HEAD")(stdout="false\nabc\n")
+    git.register("git count-objects -v")()
+    git.register("git fetch --filter=blob:none --depth=50 origin main")()
+    git.register("git merge-base FETCH_HEAD HEAD")(stdout="def\n")
+    git.register("git count-objects -v")()
+    git.register("git diff --unified=0 def -- src")(
+        stdout="+++ b/src/a.py\n@@ -0,0 +1 @@\n+a\n"
+    )
+
+    result = main.get_added_lines(
+        config=pull_request_config(DIFF_SOURCE="api", DIFF_PATHSPEC=["src"]),
+        gh=gh,
+        git=git,
+        base_ref="main",
+    )
+
+    assert result == {"src/a.py": [(1, 2)]}
+    assert get_logs("INFO", "is not the head of the PR")
@@ -44,6 +44,11 @@ def test_config__from_environ__ok():
             "MINIMUM_GREEN": "90",
             "MINIMUM_ORANGE": "50.8",
             "MERGE_COVERAGE_FILES": "true",
+            "COMBINE_WORKERS": "4",
+            "COVERAGE_LOADER": "in-process",
+            "CACHE_DIR": "/tmp/cache",
+            "DIFF_PATHSPEC": "src/\n:!src/vendor/",
+            "DIFF_SOURCE": "api",
             "ANNOTATE_MISSING_LINES": "false",
             "ANNOTATION_TYPE": "error",
             "VERBOSE": "false",
@@ -67,6 +72,11 @@ def test_config__from_environ__ok():
         MINIMUM_GREEN=decimal.Decimal("90"),
         MINIMUM_ORANGE=decimal.Decimal("50.8"),
         MERGE_COVERAGE_FILES=True,
+        COMBINE_WORKERS=4,
+        COVERAGE_LOADER="in-process",
+        CACHE_DIR=pathlib.Path("/tmp/cache"),
+        DIFF_PATHSPEC=["src/", ":!src/vendor/"],
+        DIFF_SOURCE="api",
         ANNOTATE_MISSING_LINES=False,
         ANNOTATION_TYPE="error",
         VERBOSE=False,
@@ -155,6 +165,38 @@ def test_config__invalid_annotation_type():
         settings.Config.from_environ({"ANNOTATION_TYPE": "foo"})
 
 
+def test_config__combine_workers_empty():
+    assert settings.Config.clean_combine_workers("") == 1
+
+
+def test_config__api_retries_empty():
+    assert settings.Config.clean_api_retries("") == 3
+    assert settings.Config.clean_api_retry_budget("") == 120
+
+
+def test_config__cache_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert settings.Config.clean_cache_dir("cache") == tmp_path.resolve() / "cache"
+
+
+def test_config__cache_dir_empty():
+    assert settings.Config.clean_cache_dir("") is None
+
+
+def test_config__diff_pathspec_empty():
+    assert settings.Config.clean_diff_pathspec("") is None
+
+
+def test_config__invalid_diff_source():
+    with pytest.raises(settings.InvalidDiffSource):
+        settings.Config.from_environ({"DIFF_SOURCE": "foo"})
+
+
+def test_config__invalid_coverage_loader():
+    with pytest.raises(settings.InvalidCoverageLoader):
+        settings.Config.from_environ({"COVERAGE_LOADER": "foo"})
+
+
 @pytest.mark.parametrize(
     "input, output",
     [
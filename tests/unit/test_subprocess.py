@@ -24,6 +24,31 @@ def test_run__error():
         subprocess.run("false", path=pathlib.Path("."))
 
 
+def test_stream__ok():
+    lines = subprocess.stream("printf", "a\\nb\\n", path=pathlib.Path("."))
+    assert list(lines) == ["a\n", "b\n"]
+
+
+def test_stream__path():
+    assert list(subprocess.stream("pwd", path=pathlib.Path("/"))) == ["/\n"]
+
+
+def test_stream__lazy(tmp_path):
+    lines = subprocess.stream("touch", "foo", path=tmp_path)
+    assert not (tmp_path / "foo").exists()
+    assert list(lines) == []
+    assert (tmp_path / "foo").exists()
+
+
+def test_stream__error():
+    lines = subprocess.stream(
+        "sh", "-c", "echo foo; echo bar >&2; false", path=pathlib.Path(".")
+    )
+    assert next(lines) == "foo\n"
+    with pytest.raises(subprocess.SubProcessError, match="bar"):
+        next(lines)
+
+
 @pytest.fixture
 def environ(mocker):
     return mocker.patch("os.environ", {})
@@ -87,3 +112,31 @@ def test_git__error(mocker):
 
     with pytest.raises(subprocess.GitError):
         git.add("some_file")
+
+
+def test_git__stream(mocker, environ):
+    stream = mocker.patch(
+        "coverage_comment.subprocess.stream", return_value=iter(["a\n", "b\n"])
+    )
+    git = subprocess.Git()
+    environ["A"] = "B"
+
+    lines = git.stream("diff", "HEAD", env={"C": "D"})
+
+    assert list(lines) == ["a\n", "b\n"]
+    stream.assert_called_once_with(
+        "git", "diff", "HEAD", path=pathlib.Path("."), env=mocker.ANY
+    )
+    env = stream.call_args.kwargs["env"]
+    assert env["A"] == "B"
+    assert env["C"] == "D"
+
+
+def test_git__stream__error(mocker):
+    mocker.patch(
+        "coverage_comment.subprocess.stream", side_effect=subprocess.SubProcessError
+    )
+    git = subprocess.Git()
+
+    with pytest.raises(subprocess.GitError):
+        list(git.stream("diff"))
@@ -83,7 +83,6 @@ def test_template_full():
         info=coverage.CoverageInfo(
             covered_lines=6,
             num_statements=6,
-            percent_covered=decimal.Decimal("1"),
             missing_lines=0,
             excluded_lines=0,
             num_branches=2,
@@ -100,12 +99,11 @@ def test_template_full():
                 info=coverage.CoverageInfo(
                     covered_lines=5,
                     num_statements=6,
-                    percent_covered=decimal.Decimal("5") / decimal.Decimal("6"),
                     missing_lines=1,
                     excluded_lines=0,
-                    num_branches=2,
+                    num_branches=0,
                     num_partial_branches=0,
-                    covered_branches=2,
+                    covered_branches=0,
                     missing_branches=0,
                 ),
             ),
@@ -117,7 +115,6 @@ def test_template_full():
                 info=coverage.CoverageInfo(
                     covered_lines=6,
                     num_statements=6,
-                    percent_covered=decimal.Decimal("1"),
                     missing_lines=0,
                     excluded_lines=0,
                     num_branches=2,
@@ -132,17 +129,18 @@ def test_template_full():
     diff_cov = coverage.DiffCoverage(
         total_num_lines=6,
         total_num_violations=0,
-        total_percent_covered=decimal.Decimal("1"),
         num_changed_lines=39,
         files={
             pathlib.Path("codebase/code.py"): coverage.FileDiffCoverage(
                 path=pathlib.Path("codebase/code.py"),
-                percent_covered=decimal.Decimal("0.5"),
+                covered_lines=1,
+                num_lines=2,
                 violation_lines=[5],
             ),
             pathlib.Path("codebase/other.py"): coverage.FileDiffCoverage(
                 path=pathlib.Path("codebase/other.py"),
-                percent_covered=decimal.Decimal("1"),
+                covered_lines=4,
+                num_lines=4,
                 violation_lines=[],
             ),
         },
@@ -176,11 +174,41 @@ Missing lines: `5`
     assert result == expected
 
 
+def test_template__missing_branches(coverage_obj):
+    diff_cov = coverage.DiffCoverage(
+        total_num_lines=2,
+        total_num_violations=0,
+        num_changed_lines=2,
+        files={
+            pathlib.Path("codebase/code.py"): coverage.FileDiffCoverage(
+                path=pathlib.Path("codebase/code.py"),
+                covered_lines=2,
+                num_lines=2,
+                violation_lines=[],
+                missing_branches=[(2, 7), (5, -1)],
+            ),
+        },
+    )
+
+    result = template.get_comment_markdown(
+        coverage=coverage_obj,
+        diff_coverage=diff_cov,
+        previous_coverage_rate=decimal.Decimal("1.0"),
+        marker="<!-- foo -->",
+        base_template=template.read_template_file("comment.md.j2"),
+    )
+
+    assert (
+        "### codebase/code.py\n"
+        "`100%` of new lines are covered (`75%` of the complete file).\n"
+        "Partial branches: `2->7`, `5->exit`\n"
+    ) in result
+
+
 def test_template__no_new_lines_with_coverage(coverage_obj):
     diff_cov = coverage.DiffCoverage(
         total_num_lines=0,
         total_num_violations=0,
-        total_percent_covered=decimal.Decimal("1"),
         num_changed_lines=39,
         files={},
     )
@@ -217,7 +245,7 @@ def test_template__no_branch_no_previous(coverage_obj_no_branch, diff_coverage_o
 > This usually happens when the action has not run on the default
 > branch yet, for example right after deploying it into the workflows.
 
-The coverage rate is `75%`.
+The coverage rate is `83.33%`.
 
 `80%` of new lines are covered.
 